@@ -1,7 +1,14 @@
 import json
 import os
+import math
+import random
+import time
 import psycopg2
-from typing import Dict, Any
+import requests
+from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple, Callable
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -69,29 +76,64 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if method == 'PUT':
         body_data = json.loads(event.get('body', '{}'))
         account_id = body_data.get('id')
+        force = bool(body_data.get('force', False))
         
-        if account_id:
-            cur.execute('UPDATE t_p24911867_account_registration.google_accounts SET status = %s WHERE id = %s',
-                       ('checking', account_id))
-            conn.commit()
+        checker = get_google_checker()
+        if checker is None:
+            cur.close()
+            conn.close()
             
-            cur.execute('SELECT email, password FROM t_p24911867_account_registration.google_accounts WHERE id = %s', (account_id,))
-            account_data = cur.fetchone()
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'success': False,
+                    'error': f"Неизвестный или не настроенный GOOGLE_CHECKER_BACKEND: {os.environ.get('GOOGLE_CHECKER_BACKEND', 'stub')}"
+                })
+            }
+        
+        if body_data.get('all') or body_data.get('ids'):
+            results, next_after_id = validate_accounts(
+                conn, cur, checker, None if body_data.get('all') else body_data['ids'], force,
+                after_id=int(body_data.get('afterId') or 0), batched=True
+            )
+            cur.close()
+            conn.close()
             
-            if account_data:
-                is_valid = test_google_account(account_data[0], account_data[1])
-                status = 'active' if is_valid else 'failed'
-                cur.execute('UPDATE t_p24911867_account_registration.google_accounts SET status = %s WHERE id = %s', (status, account_id))
-                conn.commit()
-                
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'success': True,
+                    'total': len(results),
+                    'valid': sum(1 for r in results.values() if r['valid'] is True),
+                    'failed': sum(1 for r in results.values() if r['valid'] is False),
+                    'timedOut': sum(1 for r in results.values() if r['valid'] is None),
+                    'cached': sum(1 for r in results.values() if r['cached']),
+                    'nextAfterId': next_after_id
+                })
+            }
+        
+        if account_id:
+            results, _ = validate_accounts(conn, cur, checker, [account_id], force)
+            result = results.get(int(account_id))
+            
+            if result:
                 cur.close()
                 conn.close()
                 
+                if result['valid'] is None:
+                    message = 'Проверка не уложилась в таймаут'
+                else:
+                    message = 'Аккаунт работает' if result['valid'] else 'Не удалось войти'
+                
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'success': is_valid, 'message': 'Аккаунт работает' if is_valid else 'Не удалось войти'})
+                    'body': json.dumps({'success': result['valid'] is True, 'cached': result['cached'], 'message': message})
                 }
         
         cur.close()
@@ -131,6 +173,149 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
 
-def test_google_account(email: str, password: str) -> bool:
-    import random
-    return random.random() > 0.1
\ No newline at end of file
+def load_settings(cur) -> Dict[str, str]:
+    cur.execute('SELECT setting_key, setting_value FROM t_p24911867_account_registration.automation_settings')
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+
+BULK_CHECK_BUDGET_SECONDS = 20
+
+
+def validate_accounts(conn, cur, checker: Callable[[str, str, float], bool],
+                      account_ids: Optional[List[int]], force: bool = False,
+                      after_id: int = 0, batched: bool = False) -> Tuple[Dict[int, Dict[str, Any]], Optional[int]]:
+    '''
+    Проверяет аккаунты параллельно (не больше account_check_workers одновременно),
+    пропуская проверенные в пределах account_check_ttl_minutes, и записывает статусы одним UPDATE.
+    При batched за вызов проверяется не больше аккаунтов, чем успеет уложиться в BULK_CHECK_BUDGET_SECONDS,
+    начиная с id > after_id; возвращает (результаты, id для следующего вызова или None, если всё проверено)
+    '''
+    settings = load_settings(cur)
+    ttl = timedelta(minutes=int(settings.get('account_check_ttl_minutes', '60')))
+    workers = max(1, int(settings.get('account_check_workers', '10')))
+    check_timeout = float(settings.get('account_check_timeout', '15'))
+    
+    batch_size = workers * max(1, int(BULK_CHECK_BUDGET_SECONDS // check_timeout)) if batched else None
+    
+    if account_ids is None:
+        cur.execute(
+            'SELECT id, email, password, status, last_checked FROM t_p24911867_account_registration.google_accounts WHERE id > %s ORDER BY id',
+            (after_id,)
+        )
+    else:
+        cur.execute(
+            'SELECT id, email, password, status, last_checked FROM t_p24911867_account_registration.google_accounts WHERE id = ANY(%s) AND id > %s ORDER BY id',
+            ([int(i) for i in account_ids], after_id)
+        )
+    rows = cur.fetchall()
+    
+    now = datetime.utcnow()
+    results: Dict[int, Dict[str, Any]] = {}
+    to_check = []
+    next_after_id = None
+    last_id = after_id
+    for acc_id, email, password, status, last_checked in rows:
+        if not force and last_checked and now - last_checked < ttl and status in ('active', 'failed'):
+            results[acc_id] = {'valid': status == 'active', 'cached': True}
+        elif batch_size is not None and len(to_check) >= batch_size:
+            next_after_id = last_id
+            break
+        else:
+            to_check.append((acc_id, email, password))
+        last_id = acc_id
+    
+    checked = run_account_checks(checker, to_check, workers, check_timeout)
+    for acc_id, is_valid in checked.items():
+        results[acc_id] = {'valid': is_valid, 'cached': False}
+    
+    updates = [
+        (acc_id, 'active' if is_valid else 'failed', now)
+        for acc_id, is_valid in checked.items()
+        if is_valid is not None
+    ]
+    if updates:
+        execute_values(cur, '''
+            UPDATE t_p24911867_account_registration.google_accounts ga
+            SET status = v.status, last_checked = v.checked
+            FROM (VALUES %s) AS v(id, status, checked)
+            WHERE ga.id = v.id
+        ''', updates, template='(%s, %s, %s::timestamp)')
+        conn.commit()
+    
+    return results, next_after_id
+
+
+def run_account_checks(checker: Callable[[str, str, float], bool], accounts: List[tuple],
+                       workers: int, check_timeout: float) -> Dict[int, Optional[bool]]:
+    '''
+    Таймаут отсчитывается от начала каждой проверки: зависшая проверка получает None (timedOut),
+    не задерживая остальные. Общий срок - страховка на случай, если зависшие заняли все потоки
+    '''
+    results: Dict[int, Optional[bool]] = {acc_id: None for acc_id, _, _ in accounts}
+    if not accounts:
+        return results
+    
+    started: Dict[int, float] = {}
+    
+    def timed_check(acc_id: int, email: str, password: str) -> bool:
+        started[acc_id] = time.monotonic()
+        return checker(email, password, check_timeout)
+    
+    executor = ThreadPoolExecutor(max_workers=min(workers, len(accounts)))
+    futures = {
+        executor.submit(timed_check, acc_id, email, password): acc_id
+        for acc_id, email, password in accounts
+    }
+    deadline = time.monotonic() + check_timeout * math.ceil(len(accounts) / min(workers, len(accounts))) + 5
+    pending = set(futures)
+    
+    while pending and time.monotonic() < deadline:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                results[futures[future]] = bool(future.result())
+            except Exception as e:
+                print(f"[ACCOUNTS] Check error: {str(e)[:200]}")
+        
+        now = time.monotonic()
+        expired = {
+            future for future in pending
+            if futures[future] in started and now - started[futures[future]] > check_timeout
+        }
+        for future in expired:
+            print(f"[ACCOUNTS] Check timed out: account {futures[future]}")
+        pending -= expired
+    
+    executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+def check_google_account_stub(email: str, password: str, timeout: float) -> bool:
+    return random.random() > 0.1
+
+
+def check_google_account_http(email: str, password: str, timeout: float) -> bool:
+    response = requests.post(
+        os.environ['GOOGLE_CHECKER_URL'],
+        json={'email': email, 'password': password},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return bool(response.json().get('valid'))
+
+
+GOOGLE_CHECKERS: Dict[str, Callable[[str, str, float], bool]] = {
+    'stub': check_google_account_stub,
+    'http': check_google_account_http,
+}
+
+
+def get_google_checker() -> Optional[Callable[[str, str, float], bool]]:
+    '''
+    Возвращает проверку по GOOGLE_CHECKER_BACKEND или None, если бэкенд неизвестен
+    либо для http не задан GOOGLE_CHECKER_URL
+    '''
+    backend = os.environ.get('GOOGLE_CHECKER_BACKEND', 'stub')
+    if backend == 'http' and not os.environ.get('GOOGLE_CHECKER_URL'):
+        return None
+    return GOOGLE_CHECKERS.get(backend)
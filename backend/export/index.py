@@ -2,8 +2,27 @@ import json
 import os
 import psycopg2
 import csv
+import zlib
+import textwrap
 from io import StringIO
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+
+EXPORT_LAYOUTS = {
+    'json': ('{"accounts": [', ', ', ']}'),
+    'cookies': ('[\n', ',\n', '\n]'),
+    'txt': ('', '\n', ''),
+    'csv': ('', '', ''),
+}
+
+EMPTY_EXPORTS = {
+    'json': '{"accounts": []}',
+    'cookies': '[]',
+    'txt': '',
+    'csv': '',
+}
+
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -32,49 +51,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         include_google = params.get('includeGoogle', 'true') == 'true'
         include_proxy = params.get('includeProxy', 'true') == 'true'
         
+        if export_format not in EXPORT_LAYOUTS:
+            export_format = 'json'
+        
         conn = psycopg2.connect(os.environ['DATABASE_URL'])
         cur = conn.cursor()
         
-        cur.execute('''
-            SELECT 
-                rt.marktplaats_login, rt.marktplaats_password,
-                ga.email, ga.password,
-                p.host, p.port, p.username, p.password,
-                rt.cookies_data
-            FROM t_p24911867_account_registration.registration_tasks rt
-            LEFT JOIN t_p24911867_account_registration.google_accounts ga ON rt.google_account_id = ga.id
-            LEFT JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
-            WHERE rt.status = 'completed'
-        ''')
-        rows = cur.fetchall()
+        body = get_export_body(conn, cur, export_format, include_google, include_proxy)
         cur.close()
         conn.close()
         
-        accounts = []
-        for row in rows:
-            account = {
-                'marktplaats_login': row[0],
-                'marktplaats_password': row[1]
-            }
-            if include_google:
-                account['google_email'] = row[2]
-                account['google_password'] = row[3]
-            if include_proxy:
-                account['proxy'] = f'{row[4]}:{row[5]}' if row[4] else None
-                if row[6]:
-                    account['proxy_auth'] = f'{row[6]}:{row[7]}'
-            if row[8]:
-                account['cookies'] = row[8]
-            accounts.append(account)
+        content = assemble_export(export_format, body, include_google, include_proxy)
         
         if export_format == 'csv':
-            output = StringIO()
-            if accounts:
-                writer = csv.DictWriter(output, fieldnames=accounts[0].keys())
-                writer.writeheader()
-                writer.writerows(accounts)
-            content = output.getvalue()
-            
             return {
                 'statusCode': 200,
                 'headers': {
@@ -87,16 +76,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         elif export_format == 'txt':
-            lines = []
-            for acc in accounts:
-                line = f"{acc['marktplaats_login']}:{acc['marktplaats_password']}"
-                if include_google:
-                    line += f" | {acc.get('google_email')}:{acc.get('google_password')}"
-                if include_proxy and acc.get('proxy'):
-                    line += f" | {acc['proxy']}"
-                lines.append(line)
-            content = '\n'.join(lines)
-            
             return {
                 'statusCode': 200,
                 'headers': {
@@ -109,15 +88,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         elif export_format == 'cookies':
-            cookies_list = []
-            for acc in accounts:
-                if acc.get('cookies'):
-                    cookies_list.append({
-                        'login': acc['marktplaats_login'],
-                        'cookies': acc['cookies']
-                    })
-            content = json.dumps(cookies_list, indent=2)
-            
             return {
                 'statusCode': 200,
                 'headers': {
@@ -137,7 +107,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'Access-Control-Allow-Origin': '*'
                 },
                 'isBase64Encoded': False,
-                'body': json.dumps({'accounts': accounts})
+                'body': content
             }
     
     return {
@@ -145,4 +115,183 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         'headers': {'Access-Control-Allow-Origin': '*'},
         'isBase64Encoded': False,
         'body': json.dumps({'error': 'Method not allowed'})
-    }
\ No newline at end of file
+    }
+
+
+EXPORT_CACHE_MAX_CHUNKS = 50
+
+
+def get_export_body(conn, cur, export_format: str, include_google: bool, include_proxy: bool) -> str:
+    '''
+    Возвращает отрендеренные строки экспорта из export_cache. Кэш действителен, пока не изменились
+    MAX(completed_at) и число завершённых задач; новые завершения дописываются отдельным сжатым куском,
+    после EXPORT_CACHE_MAX_CHUNKS кусков кэш пересобирается целиком в один
+    '''
+    cache_key = f'{export_format}:{int(include_google)}:{int(include_proxy)}'
+    
+    cur.execute('''
+        SELECT MAX(completed_at), COUNT(*) FROM (
+            SELECT completed_at FROM t_p24911867_account_registration.registration_tasks WHERE status = 'completed'
+            UNION ALL
+            SELECT completed_at FROM t_p24911867_account_registration.registration_tasks_archive WHERE status = 'completed'
+        ) completed
+    ''')
+    watermark_at, watermark_count = cur.fetchone()
+    
+    cur.execute(
+        'SELECT watermark_completed_at, watermark_count, chunk_count FROM t_p24911867_account_registration.export_cache WHERE cache_key = %s',
+        (cache_key,)
+    )
+    cached = cur.fetchone()
+    
+    if cached and cached[0] == watermark_at and cached[1] == watermark_count:
+        return join_export_chunks(export_format, load_export_chunks(cur, cache_key))
+    
+    if cached and cached[0] is not None and cached[1] < watermark_count and cached[2] < EXPORT_CACHE_MAX_CHUNKS:
+        new_accounts = fetch_accounts(cur, export_format != 'txt', include_google, include_proxy, since=cached[0])
+        if cached[1] + len(new_accounts) == watermark_count:
+            chunks = load_export_chunks(cur, cache_key)
+            chunks.append(render_export_items(export_format, new_accounts, include_google, include_proxy))
+            save_export_cache(cur, cache_key, watermark_at, watermark_count, len(chunks), chunks[-1])
+            conn.commit()
+            return join_export_chunks(export_format, chunks)
+    
+    accounts = fetch_accounts(cur, export_format != 'txt', include_google, include_proxy)
+    body = render_export_items(export_format, accounts, include_google, include_proxy)
+    cur.execute('DELETE FROM t_p24911867_account_registration.export_cache_chunks WHERE cache_key = %s', (cache_key,))
+    save_export_cache(cur, cache_key, watermark_at, watermark_count, 1, body)
+    conn.commit()
+    
+    return body
+
+
+def load_export_chunks(cur, cache_key: str) -> List[str]:
+    cur.execute(
+        'SELECT content FROM t_p24911867_account_registration.export_cache_chunks WHERE cache_key = %s ORDER BY chunk_no',
+        (cache_key,)
+    )
+    return [zlib.decompress(bytes(row[0])).decode('utf-8') for row in cur.fetchall()]
+
+
+def join_export_chunks(export_format: str, chunks: List[str]) -> str:
+    return EXPORT_LAYOUTS[export_format][1].join(chunk for chunk in chunks if chunk)
+
+
+def save_export_cache(cur, cache_key: str, watermark_at: Optional[datetime], watermark_count: int,
+                      chunk_count: int, chunk: str):
+    '''
+    Записывает кусок с номером chunk_count - 1 и обновляет водяной знак; коммит делает вызывающий
+    '''
+    cur.execute('''
+        INSERT INTO t_p24911867_account_registration.export_cache_chunks (cache_key, chunk_no, content)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (cache_key, chunk_no) DO UPDATE SET content = EXCLUDED.content
+    ''', (cache_key, chunk_count - 1, psycopg2.Binary(zlib.compress(chunk.encode('utf-8')))))
+    cur.execute('''
+        INSERT INTO t_p24911867_account_registration.export_cache (cache_key, watermark_completed_at, watermark_count, chunk_count, updated_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (cache_key) DO UPDATE
+        SET watermark_completed_at = EXCLUDED.watermark_completed_at, watermark_count = EXCLUDED.watermark_count,
+            chunk_count = EXCLUDED.chunk_count, updated_at = EXCLUDED.updated_at
+    ''', (cache_key, watermark_at, watermark_count, chunk_count))
+
+
+def fetch_accounts(cur, with_cookies: bool, include_google: bool, include_proxy: bool,
+                   since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    cookies_column = 'cookies_data' if with_cookies else 'NULL'
+    since_filter = 'AND completed_at > %(since)s' if since else ''
+    
+    cur.execute(f'''
+        SELECT 
+            rt.marktplaats_login, rt.marktplaats_password,
+            ga.email, ga.password,
+            p.host, p.port, p.username, p.password,
+            rt.cookies_data
+        FROM (
+            SELECT id, google_account_id, proxy_id, marktplaats_login, marktplaats_password, completed_at, {cookies_column} AS cookies_data
+            FROM t_p24911867_account_registration.registration_tasks
+            WHERE status = 'completed' {since_filter}
+            UNION ALL
+            SELECT id, google_account_id, proxy_id, marktplaats_login, marktplaats_password, completed_at, {cookies_column} AS cookies_data
+            FROM t_p24911867_account_registration.registration_tasks_archive
+            WHERE status = 'completed' {since_filter}
+        ) rt
+        LEFT JOIN t_p24911867_account_registration.google_accounts ga ON rt.google_account_id = ga.id
+        LEFT JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
+        ORDER BY rt.completed_at NULLS FIRST, rt.id
+    ''', {'since': since})
+    
+    accounts = []
+    for row in cur.fetchall():
+        account = {
+            'marktplaats_login': row[0],
+            'marktplaats_password': row[1]
+        }
+        if include_google:
+            account['google_email'] = row[2]
+            account['google_password'] = row[3]
+        if include_proxy:
+            account['proxy'] = f'{row[4]}:{row[5]}' if row[4] else None
+            if row[6]:
+                account['proxy_auth'] = f'{row[6]}:{row[7]}'
+        if row[8]:
+            account['cookies'] = decode_cookies(row[8])
+        accounts.append(account)
+    return accounts
+
+
+def csv_fieldnames(include_google: bool, include_proxy: bool) -> List[str]:
+    fieldnames = ['marktplaats_login', 'marktplaats_password']
+    if include_google:
+        fieldnames += ['google_email', 'google_password']
+    if include_proxy:
+        fieldnames += ['proxy', 'proxy_auth']
+    return fieldnames + ['cookies']
+
+
+def render_export_items(export_format: str, accounts: List[Dict[str, Any]],
+                        include_google: bool, include_proxy: bool) -> str:
+    if export_format == 'csv':
+        output = StringIO()
+        writer = csv.DictWriter(output, fieldnames=csv_fieldnames(include_google, include_proxy))
+        writer.writerows(accounts)
+        return output.getvalue()
+    
+    if export_format == 'txt':
+        lines = []
+        for acc in accounts:
+            line = f"{acc['marktplaats_login']}:{acc['marktplaats_password']}"
+            if include_google:
+                line += f" | {acc.get('google_email')}:{acc.get('google_password')}"
+            if include_proxy and acc.get('proxy'):
+                line += f" | {acc['proxy']}"
+            lines.append(line)
+        return '\n'.join(lines)
+    
+    if export_format == 'cookies':
+        return ',\n'.join(
+            textwrap.indent(json.dumps({'login': acc['marktplaats_login'], 'cookies': acc['cookies']}, indent=2), '  ')
+            for acc in accounts if acc.get('cookies')
+        )
+    
+    return ', '.join(json.dumps(acc) for acc in accounts)
+
+
+def assemble_export(export_format: str, body: str, include_google: bool, include_proxy: bool) -> str:
+    if not body:
+        return EMPTY_EXPORTS[export_format]
+    if export_format == 'csv':
+        output = StringIO()
+        csv.DictWriter(output, fieldnames=csv_fieldnames(include_google, include_proxy)).writeheader()
+        return output.getvalue() + body
+    prefix, _, suffix = EXPORT_LAYOUTS[export_format]
+    return prefix + body + suffix
+
+
+def decode_cookies(raw: Any) -> str:
+    data = bytes(raw)
+    try:
+        data = zlib.decompress(data)
+    except zlib.error:
+        pass
+    return data.decode('utf-8')
@@ -30,7 +30,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cur = conn.cursor()
     
     if method == 'GET':
-        cur.execute('SELECT id, host, port, username, status, last_checked, created_at FROM t_p24911867_account_registration.proxies ORDER BY created_at DESC')
+        cur.execute('SELECT id, host, port, username, status, last_checked, created_at, pages_loaded, transfer_bytes, load_ms_total FROM t_p24911867_account_registration.proxies ORDER BY created_at DESC')
         rows = cur.fetchall()
         proxies = [
             {
@@ -40,7 +40,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'username': row[3],
                 'status': row[4],
                 'lastChecked': row[5].isoformat() if row[5] else None,
-                'createdAt': row[6].isoformat()
+                'createdAt': row[6].isoformat(),
+                'pagesLoaded': row[7] or 0,
+                'avgPageKb': round(row[8] / row[7] / 1024, 1) if row[7] else None,
+                'avgLoadMs': round(row[9] / row[7]) if row[7] else None
             }
             for row in rows
         ]
@@ -1,17 +1,24 @@
 import json
 import os
 import psycopg2
-from typing import Dict, Any
-from datetime import datetime
+from psycopg2.extras import execute_values
+from typing import Dict, Any, Optional, List, Tuple, Callable
+from collections import Counter
+from datetime import datetime, timedelta
 import random
 import string
 import requests
 import time
+import zlib
+import asyncio
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import Executor, Future
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -38,6 +45,71 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cur = conn.cursor()
     
     if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        
+        if params.get('view') == 'scheduler':
+            stats = get_scheduler_stats(cur, load_settings(cur))
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'scheduler': stats})
+            }
+        
+        if params.get('view') == 'summary':
+            summary = get_task_summary(cur)
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'summary': summary})
+            }
+        
+        if params.get('view') == 'archive':
+            page_param = params.get('page', '0')
+            if not page_param.isdigit():
+                cur.close()
+                conn.close()
+                
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'page должен быть неотрицательным целым числом'})
+                }
+            
+            page = int(page_param)
+            cur.execute('''
+                SELECT 
+                    rt.id, rt.status, rt.marktplaats_login, rt.error_message, rt.created_at, rt.completed_at,
+                    ga.email, p.host, p.port, rt.logs
+                FROM t_p24911867_account_registration.registration_tasks_archive rt
+                LEFT JOIN t_p24911867_account_registration.google_accounts ga ON rt.google_account_id = ga.id
+                LEFT JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
+                ORDER BY rt.created_at DESC, rt.id DESC
+                LIMIT %s OFFSET %s
+            ''', (ARCHIVE_PAGE_SIZE + 1, page * ARCHIVE_PAGE_SIZE))
+            rows = cur.fetchall()
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'tasks': [format_task(row) for row in rows[:ARCHIVE_PAGE_SIZE]],
+                    'page': page,
+                    'hasMore': len(rows) > ARCHIVE_PAGE_SIZE
+                })
+            }
+        
         cur.execute('''
             SELECT 
                 rt.id, rt.status, rt.marktplaats_login, rt.error_message, rt.created_at, rt.completed_at,
@@ -48,20 +120,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             ORDER BY rt.created_at DESC
         ''')
         rows = cur.fetchall()
-        tasks = [
-            {
-                'id': row[0],
-                'status': row[1],
-                'marktplaatsLogin': row[2],
-                'errorMessage': row[3],
-                'createdAt': row[4].isoformat(),
-                'completedAt': row[5].isoformat() if row[5] else None,
-                'email': row[6],
-                'proxy': f'{row[7]}:{row[8]}' if row[7] else None,
-                'logs': row[9]
-            }
-            for row in rows
-        ]
+        tasks = [format_task(row) for row in rows]
         cur.close()
         conn.close()
         
@@ -80,6 +139,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             task_id = body_data.get('taskId')
             if task_id:
                 cur.execute('DELETE FROM t_p24911867_account_registration.registration_tasks WHERE id = %s', (task_id,))
+                cur.execute('DELETE FROM t_p24911867_account_registration.registration_tasks_archive WHERE id = %s', (task_id,))
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -93,6 +153,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         if action == 'delete_all':
             cur.execute('DELETE FROM t_p24911867_account_registration.registration_tasks')
+            cur.execute('DELETE FROM t_p24911867_account_registration.registration_tasks_archive')
             conn.commit()
             cur.close()
             conn.close()
@@ -104,7 +165,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({'success': True})
             }
         
+        if action == 'archive':
+            settings = load_settings(cur)
+            archived = archive_finished_tasks(
+                conn, cur,
+                int(settings.get('archive_retention_days', '7')),
+                int(settings.get('archive_batch_size', '1000'))
+            )
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'success': True, 'archived': archived})
+            }
+        
         if action == 'start':
+            settings = load_settings(cur)
+            archive_finished_tasks(
+                conn, cur,
+                int(settings.get('archive_retention_days', '7')),
+                int(settings.get('archive_batch_size', '1000')),
+                max_batches=1
+            )
+            
             cur.execute('''
                 SELECT ga.id, p.id 
                 FROM t_p24911867_account_registration.google_accounts ga
@@ -116,11 +202,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE rt.google_account_id = ga.id 
                     AND rt.status IN ('waiting', 'processing', 'completed')
                 )
+                AND NOT EXISTS (
+                    SELECT 1 FROM t_p24911867_account_registration.registration_tasks_archive rta 
+                    WHERE rta.google_account_id = ga.id 
+                    AND rta.status = 'completed'
+                )
                 AND NOT EXISTS (
                     SELECT 1 FROM t_p24911867_account_registration.registration_tasks rt 
                     WHERE rt.proxy_id = p.id 
                     AND rt.status IN ('waiting', 'processing', 'completed')
                 )
+                AND NOT EXISTS (
+                    SELECT 1 FROM t_p24911867_account_registration.registration_tasks_archive rta 
+                    WHERE rta.proxy_id = p.id 
+                    AND rta.status = 'completed'
+                )
                 LIMIT 10
             ''')
             pairs = cur.fetchall()
@@ -133,6 +229,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     (google_id, proxy_id, marktplaats_login, marktplaats_password)
                 )
             
+            if pairs:
+                notify_workers(cur, 'new')
             conn.commit()
             cur.close()
             conn.close()
@@ -145,22 +243,27 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         if action == 'process':
-            cur.execute('''
-                SELECT rt.id, rt.google_account_id, rt.proxy_id, rt.marktplaats_login, rt.marktplaats_password,
-                       ga.email, ga.password, p.host, p.port, p.username, p.password
-                FROM t_p24911867_account_registration.registration_tasks rt
-                JOIN t_p24911867_account_registration.google_accounts ga ON rt.google_account_id = ga.id
-                JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
-                WHERE rt.status = 'waiting'
-                ORDER BY rt.created_at ASC
-                LIMIT 1
-            ''')
-            
-            task_row = cur.fetchone()
+            settings = load_settings(cur)
+            task_row, rejected_by, retry_after = claim_task(conn, cur, settings)
             
             if not task_row:
                 cur.close()
                 conn.close()
+                
+                if rejected_by:
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({
+                            'success': True,
+                            'queued': True,
+                            'reason': rejected_by,
+                            'retryAfter': retry_after,
+                            'message': 'Нет свободных слотов, задача остаётся в очереди'
+                        })
+                    }
+                
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -169,35 +272,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             task_id, google_account_id, proxy_id, marktplaats_login, marktplaats_password, \
-            google_email, google_password, proxy_host, proxy_port, proxy_username, proxy_password = task_row
+            google_email, google_password, proxy_host, proxy_port, proxy_username, proxy_password = task_row[:11]
             
-            cur.execute('UPDATE t_p24911867_account_registration.registration_tasks SET status = %s WHERE id = %s', 
-                       ('processing', task_id))
-            conn.commit()
+            checkpoint: Dict[str, Any] = {}
+            checkpoint_ttl = int(settings.get('checkpoint_ttl_minutes', '60'))
             
             try:
-                result = process_registration_real(
+                checkpoint.update(load_checkpoint(cur, google_account_id, proxy_id))
+                result = run_registration(
                     google_email, google_password,
                     proxy_host, proxy_port, proxy_username, proxy_password,
-                    marktplaats_login, marktplaats_password
+                    marktplaats_login, marktplaats_password,
+                    settings, checkpoint
                 )
                 
-                logs_json = json.dumps(result.get('logs', []))
-                
-                if result['success']:
-                    cur.execute('''
-                        UPDATE t_p24911867_account_registration.registration_tasks 
-                        SET status = %s, completed_at = %s, cookies_data = %s, logs = %s 
-                        WHERE id = %s
-                    ''', ('completed', datetime.utcnow(), result.get('cookies'), logs_json, task_id))
-                else:
-                    cur.execute('''
-                        UPDATE t_p24911867_account_registration.registration_tasks 
-                        SET status = %s, error_message = %s, attempts = attempts + 1, logs = %s 
-                        WHERE id = %s
-                    ''', ('failed', result.get('error', 'Unknown error'), logs_json, task_id))
-                
-                conn.commit()
+                save_checkpoint(cur, google_account_id, proxy_id, result, checkpoint, checkpoint_ttl)
+                result['requeued'] = save_task_result(conn, cur, task_id, result, settings) == 'waiting'
                 cur.close()
                 conn.close()
                 
@@ -209,12 +299,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
                 
             except Exception as e:
-                cur.execute('''
-                    UPDATE t_p24911867_account_registration.registration_tasks 
-                    SET status = %s, error_message = %s, attempts = attempts + 1 
-                    WHERE id = %s
-                ''', ('failed', str(e)[:500], task_id))
-                conn.commit()
+                conn.rollback()
+                save_checkpoint(cur, google_account_id, proxy_id, {'success': False}, checkpoint, checkpoint_ttl)
+                save_task_exception(conn, cur, task_id, e, settings)
                 cur.close()
                 conn.close()
                 
@@ -236,6 +323,753 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
 
+def load_settings(cur) -> Dict[str, str]:
+    cur.execute('SELECT setting_key, setting_value FROM t_p24911867_account_registration.automation_settings')
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def archive_finished_tasks(conn, cur, retention_days: int, batch_size: int, max_batches: Optional[int] = None) -> int:
+    '''
+    Переносит завершённые и упавшие задачи старше retention_days в архив пачками по batch_size,
+    фиксируя транзакцию после каждой пачки, чтобы не держать длинные блокировки на очереди
+    '''
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+    batches = 0
+    
+    while max_batches is None or batches < max_batches:
+        cur.execute('''
+            WITH moved AS (
+                DELETE FROM t_p24911867_account_registration.registration_tasks
+                WHERE id IN (
+                    SELECT id FROM t_p24911867_account_registration.registration_tasks
+                    WHERE status IN ('completed', 'failed')
+                    AND COALESCE(completed_at, created_at) < %s
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, google_account_id, proxy_id, marktplaats_login, marktplaats_password,
+                          status, error_message, attempts, created_at, completed_at, cookies_data, logs, started_at
+            )
+            INSERT INTO t_p24911867_account_registration.registration_tasks_archive
+                (id, google_account_id, proxy_id, marktplaats_login, marktplaats_password,
+                 status, error_message, attempts, created_at, completed_at, cookies_data, logs, started_at)
+            SELECT * FROM moved
+        ''', (cutoff, batch_size))
+        moved_count = cur.rowcount
+        conn.commit()
+        
+        archived += moved_count
+        batches += 1
+        if moved_count < batch_size:
+            break
+    
+    return archived
+
+
+ARCHIVE_PAGE_SIZE = 100
+
+RECENT_ERRORS_LIMIT = 50
+
+
+def format_task(row: tuple) -> Dict[str, Any]:
+    return {
+        'id': row[0],
+        'status': row[1],
+        'marktplaatsLogin': row[2],
+        'errorMessage': row[3],
+        'createdAt': row[4].isoformat(),
+        'completedAt': row[5].isoformat() if row[5] else None,
+        'email': row[6],
+        'proxy': f'{row[7]}:{row[8]}' if row[7] else None,
+        'logs': row[9]
+    }
+
+
+def get_task_summary(cur) -> Dict[str, Any]:
+    '''
+    Сводка для вкладки статистики по горячей таблице и архиву вместе,
+    чтобы архивация не обнуляла счётчики и историю ошибок
+    '''
+    all_tasks = '''
+        SELECT id, status, google_account_id, proxy_id, error_message, created_at, completed_at
+        FROM t_p24911867_account_registration.registration_tasks
+        UNION ALL
+        SELECT id, status, google_account_id, proxy_id, error_message, created_at, completed_at
+        FROM t_p24911867_account_registration.registration_tasks_archive
+    '''
+    
+    cur.execute(f'SELECT status, COUNT(*) FROM ({all_tasks}) t GROUP BY status')
+    status_counts = {row[0]: row[1] for row in cur.fetchall()}
+    
+    cur.execute(f'''
+        SELECT DATE(created_at), COUNT(*),
+               COUNT(*) FILTER (WHERE status = 'completed'),
+               COUNT(*) FILTER (WHERE status = 'failed')
+        FROM ({all_tasks}) t
+        WHERE completed_at IS NOT NULL
+        GROUP BY 1
+        ORDER BY 1
+    ''')
+    timeline = [
+        {'date': row[0].isoformat(), 'count': row[1], 'success': row[2], 'failed': row[3]}
+        for row in cur.fetchall()
+    ]
+    
+    cur.execute(f'''
+        SELECT COALESCE(t.error_message, 'Неизвестная ошибка'), COUNT(*),
+               (ARRAY_AGG(DISTINCT ga.email) FILTER (WHERE ga.email IS NOT NULL))[1:5]
+        FROM ({all_tasks}) t
+        LEFT JOIN t_p24911867_account_registration.google_accounts ga ON t.google_account_id = ga.id
+        WHERE t.status = 'failed'
+        GROUP BY 1
+        ORDER BY 2 DESC
+    ''')
+    errors = [{'error': row[0], 'count': row[1], 'emails': row[2] or []} for row in cur.fetchall()]
+    
+    cur.execute(f'''
+        SELECT t.id, t.status, NULL, t.error_message, t.created_at, t.completed_at,
+               ga.email, p.host, p.port, NULL
+        FROM ({all_tasks}) t
+        LEFT JOIN t_p24911867_account_registration.google_accounts ga ON t.google_account_id = ga.id
+        LEFT JOIN t_p24911867_account_registration.proxies p ON t.proxy_id = p.id
+        WHERE t.status = 'failed' AND t.error_message IS NOT NULL
+        ORDER BY t.created_at DESC, t.id DESC
+        LIMIT %s
+    ''', (RECENT_ERRORS_LIMIT,))
+    recent_errors = [format_task(row) for row in cur.fetchall()]
+    
+    return {
+        'statusCounts': status_counts,
+        'timeline': timeline,
+        'errors': errors,
+        'recentErrors': recent_errors
+    }
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+STEALTH_SCRIPT = '''
+    Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
+    Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
+    Object.defineProperty(navigator, 'languages', {get: () => ['en-US', 'en']});
+'''
+
+PROXY_ERROR_MARKERS = (
+    'ERR_PROXY_CONNECTION_FAILED', 'ERR_TUNNEL_CONNECTION_FAILED', 'ERR_SOCKS_CONNECTION_FAILED',
+    'ERR_TIMED_OUT', 'ERR_CONNECTION_RESET', 'ERR_EMPTY_RESPONSE'
+)
+
+
+class PageSnapshot:
+    '''
+    URL и HTML страницы на один опрос wait_for_page_state: каждый запрашивается у браузера
+    не больше одного раза, сколько бы условий их ни проверяли
+    '''
+    def __init__(self, driver):
+        self.driver = driver
+        self._url: Optional[str] = None
+        self._source: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        if self._url is None:
+            self._url = self.driver.current_url
+        return self._url
+
+    @property
+    def source(self) -> str:
+        if self._source is None:
+            self._source = self.driver.page_source
+        return self._source
+
+
+def element(condition: Callable) -> Callable:
+    return lambda driver, page: condition(driver)
+
+
+def page_contains(*markers: str) -> Callable:
+    def condition(driver, page: PageSnapshot):
+        return any(marker in page.source for marker in markers)
+    return condition
+
+
+def proxy_error_page(driver, page: PageSnapshot) -> bool:
+    return page.url.startswith('chrome-error://') or page_contains(*PROXY_ERROR_MARKERS)(driver, page)
+
+
+def google_signed_in_url(url: str) -> bool:
+    '''
+    Вход подтверждён, только если браузер на самом myaccount.google.com: страницы входа
+    несут этот адрес в параметре continue, поэтому подстрока в URL ничего не значит
+    '''
+    return urlparse(url).netloc == 'myaccount.google.com'
+
+
+def google_challenge_url(url: str) -> bool:
+    '''
+    Дополнительная проверка Google - путь /challenge/... кроме /challenge/pwd, где обычный ввод пароля
+    '''
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/')
+    return parsed.netloc == 'accounts.google.com' and '/challenge/' in path and not path.endswith('/challenge/pwd')
+
+
+def google_challenge(driver, page: PageSnapshot) -> Any:
+    return google_challenge_url(page.url) or driver.find_elements(
+        By.CSS_SELECTOR, "iframe[src*='recaptcha'], iframe[title*='reCAPTCHA'], #captchaimg"
+    )
+
+
+GOOGLE_EMAIL_STATES = [
+    ('email', element(EC.presence_of_element_located((By.ID, 'identifierId')))),
+    ('unusual_traffic', page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', proxy_error_page),
+]
+
+GOOGLE_PASSWORD_STATES = [
+    ('password', element(EC.visibility_of_element_located((By.NAME, 'Passwd')))),
+    ('challenge', google_challenge),
+    ('account_not_found', page_contains("Couldn't find your Google Account", 'Не удалось найти аккаунт Google')),
+    ('rejected', page_contains('This browser or app may not be secure', "Couldn't sign you in")),
+    ('unusual_traffic', page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', proxy_error_page),
+]
+
+GOOGLE_SIGNED_IN_STATES = [
+    ('signed_in', lambda driver, page: google_signed_in_url(page.url)),
+    ('wrong_password', page_contains('Wrong password', 'Неверный пароль')),
+    ('challenge', google_challenge),
+    ('rejected', page_contains('This browser or app may not be secure', "Couldn't sign you in")),
+    ('unusual_traffic', page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', proxy_error_page),
+]
+
+GOOGLE_SESSION_STATES = [
+    ('signed_out', lambda driver, page: urlparse(page.url).netloc == 'accounts.google.com'),
+    ('signed_in', lambda driver, page: google_signed_in_url(page.url)),
+    ('proxy_error', proxy_error_page),
+]
+
+MARKTPLAATS_STATES = [
+    ('google_button', element(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Google')] | //*[contains(@aria-label, 'Google')]")))),
+    ('consent', element(EC.visibility_of_element_located((By.CSS_SELECTOR, "iframe[id^='sp_message_iframe']")))),
+    ('login_button', element(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Inloggen')] | //a[contains(text(), 'Inloggen')]")))),
+    ('blocked', lambda driver, page: driver.find_elements(By.CSS_SELECTOR, "iframe[src*='captcha-delivery.com']") or page_contains('Access Denied', 'Toegang geweigerd')(driver, page)),
+    ('proxy_error', proxy_error_page),
+]
+
+PAGE_STATE_ERRORS = {
+    'challenge': 'Google требует дополнительную проверку (2FA/капча)',
+    'account_not_found': 'Google аккаунт не найден',
+    'rejected': 'Google отклонил вход из этого браузера',
+    'wrong_password': 'Неверный пароль Google аккаунта',
+    'unusual_traffic': 'Google обнаружил подозрительный трафик с прокси',
+    'blocked': 'Marktplaats заблокировал доступ (капча/антибот)',
+    'login_button': 'Не найдена кнопка входа через Google',
+    'consent': 'Не удалось закрыть cookie-баннер Marktplaats',
+    'timeout': 'Timeout: элемент не найден или страница не загрузилась',
+    'proxy_auth_unsupported': 'Playwright не поддерживает SOCKS5-прокси с авторизацией: используйте прокси без пароля или REGISTRATION_ENGINE=selenium',
+}
+
+
+def wait_for_page_state(driver, states: List[Tuple[str, Callable]], timeout: float) -> Tuple[str, Any]:
+    '''
+    Ждёт одновременно все состояния страницы и возвращает (имя, результат условия) первого совпавшего.
+    Условия получают (driver, PageSnapshot), снимок создаётся заново на каждый опрос.
+    При таймауте возвращает ('timeout', None)
+    '''
+    def match(d):
+        page = PageSnapshot(d)
+        for name, condition in states:
+            try:
+                found = condition(d, page)
+            except (NoSuchElementException, StaleElementReferenceException):
+                found = False
+            if found:
+                return name, found
+        return False
+    
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=0.5).until(match)
+    except TimeoutException:
+        return 'timeout', None
+
+
+def exception_error(error: Exception, proxy_host: str, proxy_port: str, logs: List[str],
+                    page_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    error_msg = str(error)
+    if 'net::ERR_PROXY_CONNECTION_FAILED' in error_msg or 'NS_ERROR_PROXY_CONNECTION_REFUSED' in error_msg:
+        return {
+            'success': False,
+            'error': f'Proxy error: не удалось подключиться к {proxy_host}:{proxy_port}',
+            'pageStats': page_stats,
+            'logs': logs
+        }
+    elif 'net::ERR_TIMED_OUT' in error_msg or 'Timeout' in error_msg:
+        return {
+            'success': False,
+            'error': f'Timeout: прокси {proxy_host}:{proxy_port} не отвечает',
+            'pageStats': page_stats,
+            'logs': logs
+        }
+    else:
+        return {
+            'success': False,
+            'error': f'Error: {error_msg[:250]}',
+            'pageStats': page_stats,
+            'logs': logs
+        }
+
+
+def page_state_error(state: str, proxy_host: str, proxy_port: str, logs: List[str],
+                     page_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if state == 'proxy_error':
+        error = f'Proxy error: не удалось подключиться к {proxy_host}:{proxy_port}'
+    else:
+        error = PAGE_STATE_ERRORS.get(state, f'Неожиданное состояние страницы: {state}')
+    return {
+        'success': False,
+        'error': error,
+        'errorCategory': state,
+        'pageStats': page_stats,
+        'logs': logs
+    }
+
+
+def accept_consent(driver, frame):
+    driver.switch_to.frame(frame)
+    try:
+        buttons = driver.find_elements(By.XPATH, "//button[contains(., 'Accepteren') or contains(., 'Accept')]")
+        if buttons:
+            buttons[0].click()
+    finally:
+        driver.switch_to.default_content()
+
+
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.avif*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*', '*.ogg*'],
+    'stylesheet': ['*.css*'],
+}
+
+PAGE_STATS_SCRIPT = '''
+    const nav = performance.getEntriesByType('navigation')[0];
+    const resources = performance.getEntriesByType('resource');
+    return {
+        url: location.href,
+        transferBytes: (nav ? nav.transferSize : 0) + resources.reduce((sum, r) => sum + (r.transferSize || 0), 0),
+        resources: resources.length,
+        loadMs: nav ? Math.round((nav.loadEventEnd || nav.domContentLoadedEventEnd) - nav.startTime) : null
+    };
+'''
+
+
+def setting_list(settings: Dict[str, str], key: str) -> List[str]:
+    return [item.strip() for item in settings.get(key, '').split(',') if item.strip()]
+
+
+def blocked_url_patterns(settings: Dict[str, str]) -> List[str]:
+    patterns = []
+    for resource_type in setting_list(settings, 'block_resource_types'):
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    for domain in setting_list(settings, 'block_domains'):
+        patterns.append(f'*{domain}*')
+    return patterns
+
+
+def execute_cdp(driver, cmd: str, params: Dict[str, Any]) -> Any:
+    '''
+    webdriver.Remote не умеет execute_cdp_cmd, поэтому регистрируем chromium-эндпоинт goog/cdp/execute вручную
+    '''
+    driver.command_executor._commands['executeCdpCommand'] = ('POST', '/session/$sessionId/goog/cdp/execute')
+    return driver.execute('executeCdpCommand', {'cmd': cmd, 'params': params})['value']
+
+
+def collect_page_stats(driver) -> Optional[Dict[str, Any]]:
+    try:
+        return driver.execute_script(PAGE_STATS_SCRIPT)
+    except Exception:
+        return None
+
+
+SCHEDULER_LOCK_ID = 24911867
+TASKS_CHANNEL = 'registration_tasks'
+SCHEDULER_SCAN_LIMIT = 50
+
+
+def claim_task(conn, cur, settings: Dict[str, str],
+               browser_key: Optional[str] = None) -> Tuple[Optional[tuple], Optional[str], Optional[float]]:
+    '''
+    Захватывает следующую ожидающую задачу с учётом лимитов: глобального числа браузеров,
+    одновременных сессий на прокси/подсеть и token bucket на прокси/подсеть.
+    max_browser_sessions ограничивает браузеры: задачи с одним browser_key (воркер с общим
+    playwright-движком) делят один браузер, до browser_contexts_per_instance контекстов,
+    задача без browser_key открывает собственный браузер.
+    Возвращает (строка задачи, None, None) или (None, причина отказа, секунд до пополнения токенов);
+    при отказе задача остаётся в очереди.
+    Задачи с истёкшей арендой возвращаются в очередь (или падают после max_retries попыток).
+    Под playwright задачи с SOCKS5-прокси с авторизацией сразу падают, не занимая слот и токены
+    '''
+    max_sessions = int(settings.get('max_browser_sessions', '5'))
+    contexts_per_browser = int(settings.get('browser_contexts_per_instance', '10'))
+    lease_seconds = int(settings.get('session_lease_seconds', '600'))
+    max_retries = int(settings.get('max_retries', '3'))
+    proxy_max = int(settings.get('proxy_max_sessions', '1'))
+    subnet_max = int(settings.get('subnet_max_sessions', '2'))
+    proxy_bucket = (float(settings.get('proxy_bucket_capacity', '2')), float(settings.get('proxy_refill_per_minute', '1')))
+    subnet_bucket = (float(settings.get('subnet_bucket_capacity', '4')), float(settings.get('subnet_refill_per_minute', '2')))
+    
+    now = datetime.utcnow()
+    cur.execute('SELECT pg_advisory_xact_lock(%s)', (SCHEDULER_LOCK_ID,))
+    
+    cur.execute('''
+        UPDATE t_p24911867_account_registration.registration_tasks
+        SET status = CASE WHEN attempts + 1 < %s THEN 'waiting' ELSE 'failed' END,
+            error_message = 'Истекло время аренды браузерной сессии',
+            attempts = attempts + 1, started_at = NULL
+        WHERE status = 'processing'
+        AND COALESCE(started_at, created_at) <= %s
+    ''', (max_retries, now - timedelta(seconds=lease_seconds)))
+    if cur.rowcount:
+        record_scheduler_metrics(cur, {'lease_expired': cur.rowcount})
+    
+    cur.execute('''
+        SELECT p.host, p.port, COALESCE(rt.browser_key, 'task:' || rt.id)
+        FROM t_p24911867_account_registration.registration_tasks rt
+        JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
+        WHERE rt.status = 'processing'
+    ''')
+    active = cur.fetchall()
+    
+    proxy_load = Counter(f'{host}:{port}' for host, port, _ in active)
+    subnet_load = Counter(proxy_subnet(host) for host, _, _ in active)
+    browser_load = Counter(key for _, _, key in active)
+    if browser_key is not None and browser_key in browser_load:
+        sessions_full = browser_load[browser_key] >= contexts_per_browser
+    else:
+        sessions_full = len(browser_load) >= max_sessions
+    
+    cur.execute('''
+        SELECT rt.id, rt.google_account_id, rt.proxy_id, rt.marktplaats_login, rt.marktplaats_password,
+               ga.email, ga.password, p.host, p.port, p.username, p.password, rt.created_at
+        FROM t_p24911867_account_registration.registration_tasks rt
+        JOIN t_p24911867_account_registration.google_accounts ga ON rt.google_account_id = ga.id
+        JOIN t_p24911867_account_registration.proxies p ON rt.proxy_id = p.id
+        WHERE rt.status = 'waiting'
+        ORDER BY rt.created_at ASC
+        LIMIT %s
+    ''', (SCHEDULER_SCAN_LIMIT,))
+    candidates = cur.fetchall()
+    
+    if sessions_full:
+        record_deferred_tasks(cur, {row[0]: 'sessions' for row in candidates})
+        conn.commit()
+        return None, 'sessions', None
+    
+    deferred: Dict[int, str] = {}
+    retry_after: Optional[float] = None
+    for row in candidates:
+        proxy_key = f'{row[7]}:{row[8]}'
+        subnet_key = proxy_subnet(row[7])
+        
+        if row[9] and row[10] and registration_engine() == 'playwright':
+            cur.execute(
+                'UPDATE t_p24911867_account_registration.registration_tasks SET status = %s, error_message = %s, attempts = attempts + 1 WHERE id = %s',
+                ('failed', PAGE_STATE_ERRORS['proxy_auth_unsupported'], row[0])
+            )
+            record_scheduler_metrics(cur, {'proxy_auth_unsupported': 1})
+            continue
+        if proxy_load[proxy_key] >= proxy_max:
+            deferred[row[0]] = 'proxy'
+            continue
+        if subnet_load[subnet_key] >= subnet_max:
+            deferred[row[0]] = 'subnet'
+            continue
+        taken, refill_seconds = take_tokens(cur, [('proxy:' + proxy_key, *proxy_bucket), ('subnet:' + subnet_key, *subnet_bucket)], now)
+        if not taken:
+            deferred[row[0]] = 'rate'
+            retry_after = refill_seconds if retry_after is None else min(retry_after, refill_seconds)
+            continue
+        
+        cur.execute(
+            'UPDATE t_p24911867_account_registration.registration_tasks SET status = %s, started_at = %s, browser_key = %s WHERE id = %s',
+            ('processing', now, browser_key, row[0])
+        )
+        wait_seconds = (now - row[11]).total_seconds()
+        record_scheduler_metrics(cur, {'admitted': 1, 'wait_seconds_total': wait_seconds}, {'wait_seconds_max': wait_seconds})
+        record_deferred_tasks(cur, deferred)
+        conn.commit()
+        return row, None, None
+    
+    record_deferred_tasks(cur, deferred)
+    conn.commit()
+    if retry_after == float('inf'):
+        retry_after = None
+    return None, list(deferred.values())[-1] if deferred else None, retry_after
+
+
+def registration_engine() -> str:
+    return os.environ.get('REGISTRATION_ENGINE', 'selenium')
+
+
+def proxy_subnet(host: str) -> str:
+    parts = host.split('.')
+    if len(parts) == 4 and all(part.isdigit() for part in parts):
+        return '.'.join(parts[:3]) + '.0/24'
+    return host
+
+
+def take_tokens(cur, buckets: List[Tuple[str, float, float]], now: datetime) -> Tuple[bool, float]:
+    '''
+    Списывает по токену из каждого ведра. Если хоть в одном меньше токена, ничего не списывает
+    и возвращает (False, секунд до появления токена во всех вёдрах)
+    '''
+    cur.execute(
+        'SELECT bucket_key, tokens, updated_at FROM t_p24911867_account_registration.scheduler_buckets WHERE bucket_key = ANY(%s)',
+        ([bucket[0] for bucket in buckets],)
+    )
+    state = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+    
+    levels = {}
+    for key, capacity, refill_per_minute in buckets:
+        tokens, updated_at = state.get(key, (capacity, now))
+        levels[key] = min(capacity, tokens + (now - updated_at).total_seconds() * refill_per_minute / 60)
+    
+    shortage = [(1 - levels[key], refill_per_minute) for key, _, refill_per_minute in buckets if levels[key] < 1]
+    if shortage:
+        return False, max(
+            missing * 60 / refill_per_minute if refill_per_minute > 0 else float('inf')
+            for missing, refill_per_minute in shortage
+        )
+    
+    execute_values(cur, '''
+        INSERT INTO t_p24911867_account_registration.scheduler_buckets (bucket_key, tokens, updated_at)
+        VALUES %s
+        ON CONFLICT (bucket_key) DO UPDATE SET tokens = EXCLUDED.tokens, updated_at = EXCLUDED.updated_at
+    ''', [(key, level - 1, now) for key, level in levels.items()])
+    return True, 0.0
+
+
+def record_deferred_tasks(cur, deferred: Dict[int, str]):
+    '''
+    Запоминает первую причину отказа для каждой задачи и увеличивает rejected_<причина>
+    только для задач, отложенных впервые, поэтому повторные попытки захвата не раздувают счётчики
+    '''
+    if not deferred:
+        return
+    rows = execute_values(cur, '''
+        UPDATE t_p24911867_account_registration.registration_tasks rt
+        SET deferred_by = v.reason
+        FROM (VALUES %s) AS v(id, reason)
+        WHERE rt.id = v.id AND rt.deferred_by IS NULL
+        RETURNING v.reason
+    ''', list(deferred.items()), fetch=True)
+    counts = Counter(row[0] for row in rows)
+    record_scheduler_metrics(cur, {f'rejected_{reason}': count for reason, count in counts.items()})
+
+
+def record_scheduler_metrics(cur, increments: Dict[str, float], maximums: Optional[Dict[str, float]] = None):
+    if increments:
+        execute_values(cur, '''
+            INSERT INTO t_p24911867_account_registration.scheduler_metrics (metric_key, metric_value)
+            VALUES %s
+            ON CONFLICT (metric_key) DO UPDATE
+            SET metric_value = scheduler_metrics.metric_value + EXCLUDED.metric_value, updated_at = CURRENT_TIMESTAMP
+        ''', list(increments.items()))
+    if maximums:
+        execute_values(cur, '''
+            INSERT INTO t_p24911867_account_registration.scheduler_metrics (metric_key, metric_value)
+            VALUES %s
+            ON CONFLICT (metric_key) DO UPDATE
+            SET metric_value = GREATEST(scheduler_metrics.metric_value, EXCLUDED.metric_value), updated_at = CURRENT_TIMESTAMP
+        ''', list(maximums.items()))
+
+
+def get_scheduler_stats(cur, settings: Dict[str, str]) -> Dict[str, Any]:
+    cur.execute('SELECT metric_key, metric_value FROM t_p24911867_account_registration.scheduler_metrics')
+    metrics = {row[0]: row[1] for row in cur.fetchall()}
+    
+    lease_cutoff = datetime.utcnow() - timedelta(seconds=int(settings.get('session_lease_seconds', '600')))
+    cur.execute('''
+        SELECT
+            COUNT(DISTINCT COALESCE(browser_key, 'task:' || id)) FILTER (WHERE status = 'processing' AND COALESCE(started_at, created_at) > %s),
+            COUNT(*) FILTER (WHERE status = 'processing' AND COALESCE(started_at, created_at) > %s),
+            COUNT(*) FILTER (WHERE status = 'waiting')
+        FROM t_p24911867_account_registration.registration_tasks
+        WHERE status IN ('processing', 'waiting')
+    ''', (lease_cutoff, lease_cutoff))
+    active_sessions, active_tasks, waiting = cur.fetchone()
+    
+    admitted = metrics.get('admitted', 0)
+    return {
+        'maxSessions': int(settings.get('max_browser_sessions', '5')),
+        'activeSessions': active_sessions,
+        'activeTasks': active_tasks,
+        'waiting': waiting,
+        'admitted': int(admitted),
+        'rejected': {
+            'sessions': int(metrics.get('rejected_sessions', 0)),
+            'proxy': int(metrics.get('rejected_proxy', 0)),
+            'subnet': int(metrics.get('rejected_subnet', 0)),
+            'rate': int(metrics.get('rejected_rate', 0))
+        },
+        'leaseExpired': int(metrics.get('lease_expired', 0)),
+        'avgWaitSeconds': metrics.get('wait_seconds_total', 0) / admitted if admitted else 0,
+        'maxWaitSeconds': metrics.get('wait_seconds_max', 0)
+    }
+
+
+NON_RETRYABLE_ERRORS = ('account_not_found', 'wrong_password', 'rejected', 'challenge', 'proxy_auth_unsupported')
+
+
+def fail_or_requeue(cur, task_id: int, error: str, logs_json: Optional[str],
+                    settings: Optional[Dict[str, str]], retryable: bool) -> str:
+    '''
+    Помечает задачу упавшей или, при auto_retry и attempts < max_retries, возвращает её в очередь
+    с той же парой аккаунт+прокси, чтобы повтор подхватил контрольную точку входа в Google.
+    Возвращает новый статус задачи
+    '''
+    settings = settings or {}
+    retry = retryable and settings.get('auto_retry', 'false') == 'true'
+    cur.execute('''
+        UPDATE t_p24911867_account_registration.registration_tasks 
+        SET status = CASE WHEN %s AND attempts + 1 < %s THEN 'waiting' ELSE 'failed' END,
+            error_message = %s, attempts = attempts + 1, logs = COALESCE(%s, logs), started_at = NULL
+        WHERE id = %s
+        RETURNING status
+    ''', (retry, int(settings.get('max_retries', '3')), error, logs_json, task_id))
+    row = cur.fetchone()
+    status = row[0] if row else 'failed'
+    if status == 'waiting':
+        notify_workers(cur, 'requeued')
+    return status
+
+
+def save_task_result(conn, cur, task_id: int, result: Dict[str, Any],
+                     settings: Optional[Dict[str, str]] = None) -> str:
+    logs_json = json.dumps(result.get('logs', []))
+    page_stats = result.get('pageStats') or []
+    
+    if page_stats:
+        cur.execute('''
+            UPDATE t_p24911867_account_registration.proxies p
+            SET pages_loaded = p.pages_loaded + %s, transfer_bytes = p.transfer_bytes + %s, load_ms_total = p.load_ms_total + %s
+            FROM t_p24911867_account_registration.registration_tasks rt
+            WHERE rt.id = %s AND p.id = rt.proxy_id
+        ''', (
+            len(page_stats),
+            sum(stats.get('transferBytes') or 0 for stats in page_stats),
+            sum(stats.get('loadMs') or 0 for stats in page_stats),
+            task_id
+        ))
+    
+    if result['success']:
+        status = 'completed'
+        cur.execute('''
+            UPDATE t_p24911867_account_registration.registration_tasks 
+            SET status = %s, completed_at = %s, cookies_data = %s, logs = %s 
+            WHERE id = %s
+        ''', (status, datetime.utcnow(), compress_cookies(result.get('cookies')), logs_json, task_id))
+    else:
+        status = fail_or_requeue(
+            cur, task_id, result.get('error', 'Unknown error'), logs_json, settings,
+            result.get('errorCategory') not in NON_RETRYABLE_ERRORS
+        )
+    
+    notify_workers(cur, 'slot')
+    conn.commit()
+    return status
+
+
+def save_task_exception(conn, cur, task_id: int, error: Exception,
+                        settings: Optional[Dict[str, str]] = None) -> str:
+    status = fail_or_requeue(cur, task_id, str(error)[:500], None, settings, True)
+    notify_workers(cur, 'slot')
+    conn.commit()
+    return status
+
+
+def load_checkpoint(cur, google_account_id: int, proxy_id: int) -> Dict[str, Any]:
+    cur.execute('''
+        SELECT stage, cookies_data FROM t_p24911867_account_registration.registration_checkpoints
+        WHERE google_account_id = %s AND proxy_id = %s AND expires_at > %s
+    ''', (google_account_id, proxy_id, datetime.utcnow()))
+    row = cur.fetchone()
+    if not row or not row[1]:
+        return {}
+    try:
+        cookies = json.loads(zlib.decompress(bytes(row[1])).decode('utf-8'))
+    except (zlib.error, ValueError) as e:
+        print(f"LOG: [CHECKPOINT] Повреждённая контрольная точка {google_account_id}/{proxy_id}: {str(e)[:100]}")
+        return {}
+    return {'stage': row[0], 'cookies': cookies}
+
+
+def save_checkpoint(cur, google_account_id: int, proxy_id: int, result: Dict[str, Any],
+                    checkpoint: Dict[str, Any], ttl_minutes: int):
+    '''
+    Успех или недействительная сессия удаляют контрольную точку; свежий вход в Google сохраняет её на ttl_minutes.
+    Коммит делает следующий за ним save_task_result
+    '''
+    now = datetime.utcnow()
+    cur.execute(
+        'DELETE FROM t_p24911867_account_registration.registration_checkpoints WHERE expires_at < %s',
+        (now,)
+    )
+    if result['success'] or not checkpoint.get('cookies'):
+        cur.execute(
+            'DELETE FROM t_p24911867_account_registration.registration_checkpoints WHERE google_account_id = %s AND proxy_id = %s',
+            (google_account_id, proxy_id)
+        )
+    elif checkpoint.get('fresh'):
+        cur.execute('''
+            INSERT INTO t_p24911867_account_registration.registration_checkpoints
+                (google_account_id, proxy_id, stage, cookies_data, expires_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (google_account_id, proxy_id) DO UPDATE
+            SET stage = EXCLUDED.stage, cookies_data = EXCLUDED.cookies_data,
+                expires_at = EXCLUDED.expires_at, updated_at = EXCLUDED.updated_at
+        ''', (
+            google_account_id, proxy_id, checkpoint['stage'],
+            compress_cookies(json.dumps(checkpoint['cookies'], separators=(',', ':'))),
+            now + timedelta(minutes=ttl_minutes), now
+        ))
+
+
+def release_tasks(conn, cur, task_ids: List[int]):
+    if not task_ids:
+        return
+    cur.execute('''
+        UPDATE t_p24911867_account_registration.registration_tasks 
+        SET status = 'waiting', started_at = NULL 
+        WHERE id = ANY(%s) AND status = 'processing'
+    ''', (list(task_ids),))
+    notify_workers(cur, 'requeued')
+    conn.commit()
+
+
+def notify_workers(cur, reason: str):
+    '''
+    Будит воркеры, слушающие TASKS_CHANNEL; уведомление уходит при коммите транзакции
+    '''
+    cur.execute('SELECT pg_notify(%s, %s)', (TASKS_CHANNEL, reason))
+
+
+COOKIE_FIELDS = ('name', 'value', 'domain', 'path', 'expiry', 'secure', 'httpOnly', 'sameSite')
+
+
+def compact_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{k: c[k] for k in COOKIE_FIELDS if k in c} for c in cookies]
+
+
+def compress_cookies(cookies_json: Optional[str]) -> Any:
+    if not cookies_json:
+        return None
+    return psycopg2.Binary(zlib.compress(cookies_json.encode('utf-8'), 9))
+
+
 def generate_username() -> str:
     return 'user_' + ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
 
@@ -244,16 +1078,50 @@ def generate_password() -> str:
     return ''.join(random.choices(string.ascii_letters + string.digits, k=12))
 
 
+def is_google_cookie(cookie: Dict[str, Any]) -> bool:
+    return cookie.get('domain', '').lstrip('.').endswith('google.com')
+
+
+def google_session_cookies(driver) -> List[Dict[str, Any]]:
+    return compact_cookies([cookie for cookie in driver.get_cookies() if is_google_cookie(cookie)])
+
+
+def restore_google_session(driver, cookies: List[Dict[str, Any]]) -> bool:
+    driver.get('https://accounts.google.com/')
+    for cookie in cookies:
+        if not is_google_cookie(cookie):
+            continue
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException:
+            pass
+    driver.get('https://myaccount.google.com/')
+    state, _ = wait_for_page_state(driver, GOOGLE_SESSION_STATES, 15)
+    return state == 'signed_in'
+
+
 def process_registration_real(google_email: str, google_password: str, 
                               proxy_host: str, proxy_port: str, proxy_username: str, proxy_password: str,
-                              marktplaats_login: str, marktplaats_password: str) -> Dict[str, Any]:
+                              marktplaats_login: str, marktplaats_password: str,
+                              browser_settings: Optional[Dict[str, str]] = None,
+                              checkpoint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     logs = []
+    page_stats = []
     driver = None
+    browser_settings = browser_settings or {}
+    checkpoint = checkpoint if checkpoint is not None else {}
+    blocked_patterns = blocked_url_patterns(browser_settings)
     
     def add_log(step: str, message: str):
         logs.append(f"[{step}] {message}")
         print(f"LOG: [{step}] {message}")
     
+    def add_page_stats():
+        stats = collect_page_stats(driver)
+        if stats:
+            page_stats.append(stats)
+            add_log("STATS", f"{stats['url'][:80]}: {stats['transferBytes'] // 1024} KB, {stats['loadMs']} мс, ресурсов: {stats['resources']}")
+    
     try:
         add_log("INIT", f"Начало регистрации для {google_email} через {proxy_host}:{proxy_port}")
         
@@ -263,6 +1131,7 @@ def process_registration_real(google_email: str, google_password: str,
             return {
                 'success': False,
                 'error': 'BROWSERLESS_API_KEY не настроен в секретах',
+                'pageStats': page_stats,
                 'logs': logs
             }
         
@@ -283,10 +1152,14 @@ def process_registration_real(google_email: str, google_password: str,
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
         chrome_options.add_argument('--disable-features=IsolateOrigins,site-per-process')
         chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        chrome_options.add_argument(f'user-agent={USER_AGENT}')
         chrome_options.add_experimental_option('excludeSwitches', ['enable-automation'])
         chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.set_capability('goog:chromeOptions', {'prefs': {'profile.default_content_setting_values': {'notifications': 2}}})
+        prefs = {'profile.default_content_setting_values': {'notifications': 2}}
+        if 'image' in setting_list(browser_settings, 'block_resource_types'):
+            prefs['profile.managed_default_content_settings.images'] = 2
+        chrome_options.add_experimental_option('prefs', prefs)
+        chrome_options.page_load_strategy = browser_settings.get('page_load_strategy', 'normal')
         
         add_log("BROWSERLESS", "Создание WebDriver сессии")
         
@@ -296,35 +1169,58 @@ def process_registration_real(google_email: str, google_password: str,
         )
         
         driver.set_page_load_timeout(90)
-        wait = WebDriverWait(driver, 30)
         
-        driver.execute_script('''
-            Object.defineProperty(navigator, 'webdriver', {get: () => undefined});
-            Object.defineProperty(navigator, 'plugins', {get: () => [1, 2, 3, 4, 5]});
-            Object.defineProperty(navigator, 'languages', {get: () => ['en-US', 'en']});
-        ''')
-        
-        add_log("BROWSER", "Браузер запущен успешно")
+        if blocked_patterns:
+            try:
+                execute_cdp(driver, 'Network.enable', {})
+                execute_cdp(driver, 'Network.setBlockedURLs', {'urls': blocked_patterns})
+                add_log("BROWSER", f"Блокировка ресурсов: {len(blocked_patterns)} шаблонов")
+            except Exception as e:
+                add_log("BROWSER", f"CDP недоступен, блокировка ресурсов отключена: {str(e)[:100]}")
         
-        add_log("GOOGLE", "Переход на страницу входа Google")
-        driver.get('https://accounts.google.com/signin')
-        time.sleep(random.uniform(3, 6))
+        driver.execute_script(STEALTH_SCRIPT)
         
-        add_log("GOOGLE", "Ввод email")
-        email_input = wait.until(EC.presence_of_element_located((By.ID, 'identifierId')))
-        for char in google_email:
-            email_input.send_keys(char)
-            time.sleep(random.uniform(0.1, 0.3))
-        time.sleep(random.uniform(1.5, 2.5))
+        add_log("BROWSER", "Браузер запущен успешно")
         
-        add_log("GOOGLE", "Клик на кнопку 'Далее'")
-        next_button = driver.find_element(By.ID, 'identifierNext')
-        next_button.click()
-        time.sleep(random.uniform(3, 5))
+        google_session_restored = False
+        if checkpoint.get('cookies'):
+            add_log("CHECKPOINT", "Восстановление сессии Google из контрольной точки")
+            google_session_restored = restore_google_session(driver, checkpoint['cookies'])
+            if google_session_restored:
+                add_log("CHECKPOINT", "Сессия Google восстановлена, вход пропущен")
+            else:
+                add_log("CHECKPOINT", "Сессия Google недействительна, вход заново")
+                checkpoint.clear()
+                driver.delete_all_cookies()
         
-        try:
+        if not google_session_restored:
+            add_log("GOOGLE", "Переход на страницу входа Google")
+            driver.get('https://accounts.google.com/signin')
+            
+            state, email_input = wait_for_page_state(driver, GOOGLE_EMAIL_STATES, 30)
+            if state != 'email':
+                add_log("ERROR", f"Страница Google: {state}")
+                driver.quit()
+                return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+            add_page_stats()
+            time.sleep(random.uniform(1, 3))
+            
+            add_log("GOOGLE", "Ввод email")
+            for char in google_email:
+                email_input.send_keys(char)
+                time.sleep(random.uniform(0.1, 0.3))
+            time.sleep(random.uniform(1.5, 2.5))
+            
+            add_log("GOOGLE", "Клик на кнопку 'Далее'")
+            next_button = driver.find_element(By.ID, 'identifierNext')
+            next_button.click()
+            
             add_log("GOOGLE", "Ожидание поля пароля")
-            password_input = wait.until(EC.presence_of_element_located((By.NAME, 'Passwd')))
+            state, password_input = wait_for_page_state(driver, GOOGLE_PASSWORD_STATES, 30)
+            if state != 'password':
+                add_log("ERROR", f"Страница Google: {state}")
+                driver.quit()
+                return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
             
             add_log("GOOGLE", "Ввод пароля")
             password_input.send_keys(google_password)
@@ -333,49 +1229,49 @@ def process_registration_real(google_email: str, google_password: str,
             add_log("GOOGLE", "Клик на кнопку входа")
             password_next = driver.find_element(By.ID, 'passwordNext')
             password_next.click()
-            time.sleep(random.uniform(4, 6))
-            add_log("GOOGLE", "Успешный вход в Google")
-        except TimeoutException:
-            add_log("ERROR", "Google требует 2FA или капчу")
-            driver.quit()
-            return {
-                'success': False,
-                'error': 'Google требует дополнительную проверку (2FA/капча)',
-                'logs': logs
-            }
+            
+            state, _ = wait_for_page_state(driver, GOOGLE_SIGNED_IN_STATES, 15)
+            if state not in ('signed_in', 'timeout'):
+                add_log("ERROR", f"Страница Google после пароля: {state}")
+                driver.quit()
+                return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+            time.sleep(random.uniform(1, 2))
+            if state == 'signed_in':
+                add_log("GOOGLE", "Успешный вход в Google")
+                checkpoint.update({'stage': 'google_login', 'cookies': google_session_cookies(driver), 'fresh': True})
+            else:
+                add_log("GOOGLE", "Вход в Google не подтверждён, контрольная точка не сохраняется")
         
         add_log("MARKTPLAATS", "Переход на Marktplaats.nl")
         driver.get('https://www.marktplaats.nl')
-        time.sleep(random.uniform(3, 5))
         
-        try:
-            add_log("MARKTPLAATS", "Поиск кнопки входа")
-            login_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Inloggen')] | //a[contains(text(), 'Inloggen')]")))
-            add_log("MARKTPLAATS", "Клик на кнопку входа")
-            login_btn.click()
-            time.sleep(random.uniform(2, 3))
-        except:
-            add_log("MARKTPLAATS", "Кнопка входа не найдена, возможно уже авторизован")
+        add_log("MARKTPLAATS", "Поиск кнопки 'Войти через Google'")
+        for _ in range(4):
+            state, element = wait_for_page_state(driver, MARKTPLAATS_STATES, 30)
+            if state == 'consent':
+                add_log("MARKTPLAATS", "Принятие cookie-баннера")
+                accept_consent(driver, element)
+            elif state == 'login_button':
+                add_log("MARKTPLAATS", "Клик на кнопку входа")
+                element.click()
+            else:
+                break
+            time.sleep(random.uniform(1, 2))
+        add_page_stats()
         
-        try:
-            add_log("MARKTPLAATS", "Поиск кнопки 'Войти через Google'")
-            google_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Google')] | //*[contains(@aria-label, 'Google')]")))
-            add_log("MARKTPLAATS", "Клик на кнопку Google")
-            google_btn.click()
-            time.sleep(random.uniform(5, 7))
-            add_log("MARKTPLAATS", "Авторизация через Google завершена")
-        except TimeoutException:
-            add_log("ERROR", "Кнопка Google не найдена на Marktplaats")
+        if state != 'google_button':
+            add_log("ERROR", f"Страница Marktplaats: {state}")
             driver.quit()
-            return {
-                'success': False,
-                'error': 'Не найдена кнопка входа через Google',
-                'logs': logs
-            }
+            return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+        
+        add_log("MARKTPLAATS", "Клик на кнопку Google")
+        element.click()
+        time.sleep(random.uniform(5, 7))
+        add_log("MARKTPLAATS", "Авторизация через Google завершена")
         
         add_log("SUCCESS", "Получение cookies")
         cookies = driver.get_cookies()
-        cookies_json = json.dumps(cookies)
+        cookies_json = json.dumps(compact_cookies(cookies), separators=(',', ':'))
         
         current_url = driver.current_url
         page_title = driver.title
@@ -390,6 +1286,7 @@ def process_registration_real(google_email: str, google_password: str,
             'url': current_url,
             'title': page_title,
             'message': f'Регистрация завершена успешно через {proxy_host}:{proxy_port}',
+            'pageStats': page_stats,
             'logs': logs
         }
         
@@ -400,6 +1297,7 @@ def process_registration_real(google_email: str, google_password: str,
         return {
             'success': False,
             'error': 'Timeout: элемент не найден или страница не загрузилась',
+            'pageStats': page_stats,
             'logs': logs
         }
     except Exception as e:
@@ -410,22 +1308,426 @@ def process_registration_real(google_email: str, google_password: str,
             except:
                 pass
         
-        error_msg = str(e)
-        if 'net::ERR_PROXY_CONNECTION_FAILED' in error_msg or 'NS_ERROR_PROXY_CONNECTION_REFUSED' in error_msg:
-            return {
-                'success': False,
-                'error': f'Proxy error: не удалось подключиться к {proxy_host}:{proxy_port}',
-                'logs': logs
-            }
-        elif 'net::ERR_TIMED_OUT' in error_msg or 'Timeout' in error_msg:
+        return exception_error(e, proxy_host, proxy_port, logs, page_stats)
+
+
+def run_registration(google_email: str, google_password: str,
+                     proxy_host: str, proxy_port: str, proxy_username: str, proxy_password: str,
+                     marktplaats_login: str, marktplaats_password: str,
+                     browser_settings: Optional[Dict[str, str]] = None,
+                     checkpoint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    '''
+    Выбирает движок по REGISTRATION_ENGINE: selenium (сессия на задачу) или playwright (контекст на задачу)
+    '''
+    args = (google_email, google_password, proxy_host, proxy_port, proxy_username, proxy_password,
+            marktplaats_login, marktplaats_password, browser_settings, checkpoint)
+    if registration_engine() == 'playwright':
+        return get_async_engine(browser_settings).run(*args)
+    return process_registration_real(*args)
+
+
+def submit_registration(executor: Executor, *args) -> Future:
+    '''
+    Запускает регистрацию без блокировки вызывающего потока: playwright-задачи уходят корутинами
+    в цикл движка (поток на задачу не нужен), selenium-задачи - в executor
+    '''
+    if registration_engine() == 'playwright':
+        return get_async_engine(args[8]).submit(*args)
+    return executor.submit(process_registration_real, *args)
+
+
+_async_engine = None
+_async_engine_lock = threading.Lock()
+
+
+def get_async_engine(browser_settings: Optional[Dict[str, str]] = None) -> 'AsyncBrowserEngine':
+    '''
+    Движок создаётся один на процесс; лимит контекстов перечитывается из настроек при каждом вызове
+    '''
+    global _async_engine
+    max_contexts = int((browser_settings or {}).get('browser_contexts_per_instance', '10'))
+    with _async_engine_lock:
+        if _async_engine is None:
+            _async_engine = AsyncBrowserEngine(max_contexts)
+        elif browser_settings is not None:
+            _async_engine.resize(max_contexts)
+        return _async_engine
+
+
+class AsyncPageSnapshot:
+    '''
+    Асинхронный аналог PageSnapshot: HTML страницы запрашивается не больше раза за опрос,
+    page.url в playwright локальный и запроса к браузеру не требует
+    '''
+    def __init__(self, page):
+        self.page = page
+        self._content: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return self.page.url
+
+    async def content(self) -> str:
+        if self._content is None:
+            self._content = await self.page.content()
+        return self._content
+
+
+def async_visible(selector: str) -> Callable:
+    async def check(page, snapshot: AsyncPageSnapshot):
+        locator = page.locator(selector).first
+        return locator if await locator.is_visible() else None
+    return check
+
+
+def async_page_contains(*markers: str) -> Callable:
+    async def check(page, snapshot: AsyncPageSnapshot):
+        content = await snapshot.content()
+        return any(marker in content for marker in markers)
+    return check
+
+
+async def async_host_is(snapshot: AsyncPageSnapshot, host: str) -> bool:
+    return urlparse(snapshot.url).netloc == host
+
+
+async def async_google_signed_in(page, snapshot: AsyncPageSnapshot) -> bool:
+    return google_signed_in_url(snapshot.url)
+
+
+async def async_proxy_error_page(page, snapshot: AsyncPageSnapshot) -> bool:
+    return snapshot.url.startswith('chrome-error://') or await async_page_contains(*PROXY_ERROR_MARKERS)(page, snapshot)
+
+
+async def async_google_challenge(page, snapshot: AsyncPageSnapshot) -> bool:
+    return google_challenge_url(snapshot.url) or await page.locator(
+        "iframe[src*='recaptcha'], iframe[title*='reCAPTCHA'], #captchaimg"
+    ).count() > 0
+
+
+ASYNC_GOOGLE_EMAIL_STATES = [
+    ('email', async_visible('#identifierId')),
+    ('unusual_traffic', async_page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', async_proxy_error_page),
+]
+
+ASYNC_GOOGLE_PASSWORD_STATES = [
+    ('password', async_visible("input[name='Passwd']")),
+    ('challenge', async_google_challenge),
+    ('account_not_found', async_page_contains("Couldn't find your Google Account", 'Не удалось найти аккаунт Google')),
+    ('rejected', async_page_contains('This browser or app may not be secure', "Couldn't sign you in")),
+    ('unusual_traffic', async_page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', async_proxy_error_page),
+]
+
+ASYNC_GOOGLE_SIGNED_IN_STATES = [
+    ('signed_in', async_google_signed_in),
+    ('wrong_password', async_page_contains('Wrong password', 'Неверный пароль')),
+    ('challenge', async_google_challenge),
+    ('rejected', async_page_contains('This browser or app may not be secure', "Couldn't sign you in")),
+    ('unusual_traffic', async_page_contains('unusual traffic', 'Our systems have detected')),
+    ('proxy_error', async_proxy_error_page),
+]
+
+ASYNC_GOOGLE_SESSION_STATES = [
+    ('signed_out', lambda page, snapshot: async_host_is(snapshot, 'accounts.google.com')),
+    ('signed_in', async_google_signed_in),
+    ('proxy_error', async_proxy_error_page),
+]
+
+ASYNC_MARKTPLAATS_STATES = [
+    ('google_button', async_visible("xpath=//button[contains(text(), 'Google')] | //*[contains(@aria-label, 'Google')]")),
+    ('consent', async_visible("iframe[id^='sp_message_iframe']")),
+    ('login_button', async_visible("xpath=//button[contains(text(), 'Inloggen')] | //a[contains(text(), 'Inloggen')]")),
+    ('blocked', async_page_contains('captcha-delivery.com', 'Access Denied', 'Toegang geweigerd')),
+    ('proxy_error', async_proxy_error_page),
+]
+
+
+async def wait_for_page_state_async(page, states: List[Tuple[str, Callable]], timeout: float) -> Tuple[str, Any]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        snapshot = AsyncPageSnapshot(page)
+        for name, check in states:
+            try:
+                found = await check(page, snapshot)
+            except Exception:
+                found = None
+            if found:
+                return name, found
+        await asyncio.sleep(0.5)
+    return 'timeout', None
+
+
+def to_playwright_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    converted = []
+    for cookie in cookies:
+        cookie = dict(cookie)
+        expiry = cookie.pop('expiry', None)
+        if expiry:
+            cookie['expires'] = expiry
+        if cookie.get('sameSite') not in ('Strict', 'Lax', 'None'):
+            cookie.pop('sameSite', None)
+        cookie.setdefault('path', '/')
+        converted.append(cookie)
+    return converted
+
+
+def playwright_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    converted = []
+    for cookie in cookies:
+        cookie = dict(cookie)
+        expires = cookie.pop('expires', -1)
+        if expires and expires > 0:
+            cookie['expiry'] = int(expires)
+        converted.append(cookie)
+    return converted
+
+
+class AsyncBrowserEngine:
+    '''
+    Один удалённый браузер через CDP и много изолированных контекстов (свой прокси и cookies на задачу).
+    asyncio-цикл работает в отдельном потоке, run()/submit() можно вызывать из любых потоков воркера
+    '''
+
+    def __init__(self, max_contexts: int):
+        self.max_contexts = max_contexts
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-browser-engine', daemon=True)
+        self.thread.start()
+        self.playwright = None
+        self.browser = None
+        self.browser_lock = None
+        self.capacity = None
+        self.active_contexts = 0
+
+    def resize(self, max_contexts: int):
+        if max_contexts != self.max_contexts:
+            asyncio.run_coroutine_threadsafe(self.set_max_contexts(max_contexts), self.loop)
+
+    async def set_max_contexts(self, max_contexts: int):
+        if self.capacity is None:
+            self.capacity = asyncio.Condition()
+        async with self.capacity:
+            self.max_contexts = max_contexts
+            self.capacity.notify_all()
+
+    def submit(self, *args) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.register(*args), self.loop)
+
+    def run(self, *args) -> Dict[str, Any]:
+        return self.submit(*args).result()
+
+    async def get_browser(self, browserless_key: str):
+        if self.browser_lock is None:
+            self.browser_lock = asyncio.Lock()
+        async with self.browser_lock:
+            if self.browser is None or not self.browser.is_connected():
+                from playwright.async_api import async_playwright
+                if self.playwright is None:
+                    self.playwright = await async_playwright().start()
+                endpoint = os.environ.get('BROWSERLESS_WS_ENDPOINT', 'wss://chrome.browserless.io')
+                self.browser = await self.playwright.chromium.connect_over_cdp(f'{endpoint}?token={browserless_key}')
+            return self.browser
+
+    async def register(self, google_email: str, google_password: str,
+                       proxy_host: str, proxy_port: str, proxy_username: str, proxy_password: str,
+                       marktplaats_login: str, marktplaats_password: str,
+                       browser_settings: Optional[Dict[str, str]] = None,
+                       checkpoint: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.capacity is None:
+            self.capacity = asyncio.Condition()
+        async with self.capacity:
+            await self.capacity.wait_for(lambda: self.active_contexts < self.max_contexts)
+            self.active_contexts += 1
+        try:
+            return await self.register_in_context(
+                google_email, google_password, proxy_host, proxy_port, proxy_username, proxy_password,
+                marktplaats_login, marktplaats_password, browser_settings or {},
+                checkpoint if checkpoint is not None else {}
+            )
+        finally:
+            async with self.capacity:
+                self.active_contexts -= 1
+                self.capacity.notify()
+
+    async def register_in_context(self, google_email: str, google_password: str,
+                                  proxy_host: str, proxy_port: str, proxy_username: str, proxy_password: str,
+                                  marktplaats_login: str, marktplaats_password: str,
+                                  browser_settings: Dict[str, str], checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        logs = []
+        page_stats = []
+        context = None
+        blocked_types = set(setting_list(browser_settings, 'block_resource_types'))
+        blocked_domains = setting_list(browser_settings, 'block_domains')
+        wait_until = 'domcontentloaded' if browser_settings.get('page_load_strategy', 'normal') == 'eager' else 'load'
+
+        def add_log(step: str, message: str):
+            logs.append(f"[{step}] {message}")
+            print(f"LOG: [{step}] {message}")
+
+        async def add_page_stats(page):
+            try:
+                stats = await page.evaluate(f'() => {{ {PAGE_STATS_SCRIPT} }}')
+            except Exception:
+                return
+            page_stats.append(stats)
+            add_log("STATS", f"{stats['url'][:80]}: {stats['transferBytes'] // 1024} KB, {stats['loadMs']} мс, ресурсов: {stats['resources']}")
+
+        async def block_route(route):
+            request = route.request
+            if request.resource_type in blocked_types or any(domain in request.url for domain in blocked_domains):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        try:
+            add_log("INIT", f"Начало регистрации для {google_email} через {proxy_host}:{proxy_port}")
+
+            browserless_key = os.environ.get('BROWSERLESS_API_KEY')
+            if not browserless_key:
+                add_log("ERROR", "API ключ Browserless не найден")
+                return {
+                    'success': False,
+                    'error': 'BROWSERLESS_API_KEY не настроен в секретах',
+                    'pageStats': page_stats,
+                    'logs': logs
+                }
+
+            if proxy_username and proxy_password:
+                add_log("ERROR", f"Прокси {proxy_host}:{proxy_port} требует авторизации, Chromium не поддерживает её для SOCKS5")
+                return page_state_error('proxy_auth_unsupported', proxy_host, proxy_port, logs, page_stats)
+
+            add_log("BROWSERLESS", "Подключение к удаленному браузеру (playwright)")
+            browser = await self.get_browser(browserless_key)
+            add_log("BROWSERLESS", f"Прокси без авторизации: {proxy_host}:{proxy_port}")
+
+            context = await browser.new_context(
+                proxy={'server': f'socks5://{proxy_host}:{proxy_port}'},
+                user_agent=USER_AGENT,
+                viewport={'width': 1920, 'height': 1080},
+                locale='en-US'
+            )
+            await context.add_init_script(STEALTH_SCRIPT)
+            if blocked_types or blocked_domains:
+                await context.route('**/*', block_route)
+                add_log("BROWSER", f"Блокировка ресурсов: {', '.join(sorted(blocked_types))}, доменов: {len(blocked_domains)}")
+
+            page = await context.new_page()
+            page.set_default_timeout(30000)
+            page.set_default_navigation_timeout(90000)
+            add_log("BROWSER", "Контекст браузера создан")
+
+            google_session_restored = False
+            if checkpoint.get('cookies'):
+                add_log("CHECKPOINT", "Восстановление сессии Google из контрольной точки")
+                await context.add_cookies(to_playwright_cookies([c for c in checkpoint['cookies'] if is_google_cookie(c)]))
+                await page.goto('https://myaccount.google.com/', wait_until=wait_until)
+                state, _ = await wait_for_page_state_async(page, ASYNC_GOOGLE_SESSION_STATES, 15)
+                google_session_restored = state == 'signed_in'
+                if google_session_restored:
+                    add_log("CHECKPOINT", "Сессия Google восстановлена, вход пропущен")
+                else:
+                    add_log("CHECKPOINT", "Сессия Google недействительна, вход заново")
+                    checkpoint.clear()
+                    await context.clear_cookies()
+
+            if not google_session_restored:
+                add_log("GOOGLE", "Переход на страницу входа Google")
+                await page.goto('https://accounts.google.com/signin', wait_until=wait_until)
+
+                state, email_input = await wait_for_page_state_async(page, ASYNC_GOOGLE_EMAIL_STATES, 30)
+                if state != 'email':
+                    add_log("ERROR", f"Страница Google: {state}")
+                    return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+                await add_page_stats(page)
+                await asyncio.sleep(random.uniform(1, 3))
+
+                add_log("GOOGLE", "Ввод email")
+                await email_input.press_sequentially(google_email, delay=random.uniform(100, 300))
+                await asyncio.sleep(random.uniform(1.5, 2.5))
+
+                add_log("GOOGLE", "Клик на кнопку 'Далее'")
+                await page.click('#identifierNext')
+
+                add_log("GOOGLE", "Ожидание поля пароля")
+                state, password_input = await wait_for_page_state_async(page, ASYNC_GOOGLE_PASSWORD_STATES, 30)
+                if state != 'password':
+                    add_log("ERROR", f"Страница Google: {state}")
+                    return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+
+                add_log("GOOGLE", "Ввод пароля")
+                await password_input.fill(google_password)
+                await asyncio.sleep(random.uniform(1, 2))
+
+                add_log("GOOGLE", "Клик на кнопку входа")
+                await page.click('#passwordNext')
+
+                state, _ = await wait_for_page_state_async(page, ASYNC_GOOGLE_SIGNED_IN_STATES, 15)
+                if state not in ('signed_in', 'timeout'):
+                    add_log("ERROR", f"Страница Google после пароля: {state}")
+                    return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+                await asyncio.sleep(random.uniform(1, 2))
+                if state == 'signed_in':
+                    add_log("GOOGLE", "Успешный вход в Google")
+                    google_cookies = playwright_cookies(await context.cookies(['https://accounts.google.com', 'https://myaccount.google.com']))
+                    checkpoint.update({'stage': 'google_login', 'cookies': compact_cookies(google_cookies), 'fresh': True})
+                else:
+                    add_log("GOOGLE", "Вход в Google не подтверждён, контрольная точка не сохраняется")
+
+            add_log("MARKTPLAATS", "Переход на Marktplaats.nl")
+            await page.goto('https://www.marktplaats.nl', wait_until=wait_until)
+
+            add_log("MARKTPLAATS", "Поиск кнопки 'Войти через Google'")
+            for _ in range(4):
+                state, element = await wait_for_page_state_async(page, ASYNC_MARKTPLAATS_STATES, 30)
+                if state == 'consent':
+                    add_log("MARKTPLAATS", "Принятие cookie-баннера")
+                    await page.frame_locator("iframe[id^='sp_message_iframe']").locator(
+                        "button:has-text('Accepteren'), button:has-text('Accept')"
+                    ).first.click()
+                elif state == 'login_button':
+                    add_log("MARKTPLAATS", "Клик на кнопку входа")
+                    await element.click()
+                else:
+                    break
+                await asyncio.sleep(random.uniform(1, 2))
+            await add_page_stats(page)
+
+            if state != 'google_button':
+                add_log("ERROR", f"Страница Marktplaats: {state}")
+                return page_state_error(state, proxy_host, proxy_port, logs, page_stats)
+
+            add_log("MARKTPLAATS", "Клик на кнопку Google")
+            await element.click()
+            await asyncio.sleep(random.uniform(5, 7))
+            add_log("MARKTPLAATS", "Авторизация через Google завершена")
+
+            add_log("SUCCESS", "Получение cookies")
+            cookies = playwright_cookies(await context.cookies())
+            cookies_json = json.dumps(compact_cookies(cookies), separators=(',', ':'))
+
+            current_url = page.url
+            page_title = await page.title()
+
+            add_log("SUCCESS", f"Регистрация завершена. URL: {current_url}")
+
             return {
-                'success': False,
-                'error': f'Timeout: прокси {proxy_host}:{proxy_port} не отвечает',
+                'success': True,
+                'cookies': cookies_json,
+                'url': current_url,
+                'title': page_title,
+                'message': f'Регистрация завершена успешно через {proxy_host}:{proxy_port}',
+                'pageStats': page_stats,
                 'logs': logs
             }
-        else:
-            return {
-                'success': False,
-                'error': f'Error: {error_msg[:250]}',
-                'logs': logs
-            }
\ No newline at end of file
+
+        except Exception as e:
+            add_log("ERROR", f"Исключение: {str(e)[:200]}")
+            return exception_error(e, proxy_host, proxy_port, logs, page_stats)
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
@@ -0,0 +1,332 @@
+'''
+Business: Фоновый воркер регистрации, забирает задачи из очереди без участия фронтенда
+Запуск: python -m backend.registration.worker --concurrency 3
+Движок браузера: REGISTRATION_ENGINE=selenium|playwright (playwright - много контекстов в одном браузере)
+--concurrency - сколько задач держать в работе: для selenium это потоки с браузерами, для playwright
+задачи идут корутинами без потока на задачу (по умолчанию browser_contexts_per_instance)
+Новые задачи приходят через LISTEN/NOTIFY, при упоре в token bucket захват повторяется
+к пополнению токенов; опрос очереди - только запасной вариант раз в --poll-interval
+Сигналы: SIGTERM/SIGINT - дождаться текущих задач и выйти, SIGUSR1 - вывести метрики
+'''
+import argparse
+import json
+import os
+import queue
+import select
+import signal
+import threading
+import time
+import uuid
+import psycopg2
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from backend.registration.index import (
+    claim_task, load_settings, submit_registration, registration_engine,
+    save_task_result, save_task_exception, release_tasks, TASKS_CHANNEL,
+    load_checkpoint, save_checkpoint
+)
+
+
+class WorkerMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters: Dict[str, float] = {
+            'claimed': 0,
+            'completed': 0,
+            'failed': 0,
+            'errors': 0,
+            'released': 0,
+            'queued': 0,
+            'idle': 0,
+            'wakeups': 0,
+            'checkpoints_restored': 0,
+            'retried': 0,
+            'task_seconds_total': 0.0
+        }
+        self.in_flight = 0
+
+    def incr(self, key: str, value: float = 1):
+        with self.lock:
+            self.counters[key] += value
+
+    def task_started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def task_finished(self, seconds: float):
+        with self.lock:
+            self.in_flight -= 1
+            self.counters['task_seconds_total'] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            data = dict(self.counters)
+            data['in_flight'] = self.in_flight
+        finished = data['completed'] + data['failed'] + data['errors']
+        data['avg_task_seconds'] = data['task_seconds_total'] / finished if finished else 0
+        data['uptime_seconds'] = time.time() - self.started_at
+        return data
+
+
+class RegistrationWorker:
+    '''
+    Один поток захватывает задачи и запускает их без ожидания, пока занято меньше concurrency слотов;
+    результаты завершившихся задач записывает отдельный поток со своим соединением
+    '''
+
+    def __init__(self, concurrency: int, poll_interval: float, metrics_interval: float,
+                 metrics_file: Optional[str] = None):
+        self.worker_id = f'{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.engine = registration_engine()
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.metrics_file = metrics_file
+        self.metrics = WorkerMetrics()
+        self.stop_event = threading.Event()
+        self.dump_requested = threading.Event()
+        self.wakeup = threading.Condition()
+        self.woken = False
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.finished: 'queue.Queue[tuple]' = queue.Queue()
+        self.executor = None if self.engine == 'playwright' else ThreadPoolExecutor(
+            concurrency, thread_name_prefix='registration-task'
+        )
+        self.claimer: Optional[threading.Thread] = None
+        # playwright-задачи этого процесса делят один браузер движка, selenium открывает браузер на задачу
+        self.browser_key = self.worker_id if self.engine == 'playwright' else None
+
+    def log(self, message: str):
+        print(f"[WORKER {self.worker_id}] {message}", flush=True)
+
+    def dump_metrics(self):
+        data = self.metrics.snapshot()
+        data['worker_id'] = self.worker_id
+        self.log(f"metrics {json.dumps(data)}")
+        if self.metrics_file:
+            tmp_path = f'{self.metrics_file}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.metrics_file)
+
+    def request_stop(self, signum, frame):
+        self.stop_event.set()
+
+    def request_dump(self, signum, frame):
+        self.dump_requested.set()
+
+    def wake(self):
+        '''
+        Задачи захватывает один поток, поэтому уведомление будит ровно его. Уведомление,
+        пришедшее во время захвата, не теряется: следующий wait_for_work вернётся сразу
+        '''
+        with self.wakeup:
+            self.woken = True
+            self.wakeup.notify()
+
+    def wait_for_work(self, retry_after: Optional[float] = None):
+        timeout = self.poll_interval if retry_after is None else min(self.poll_interval, retry_after)
+        with self.wakeup:
+            self.wakeup.wait_for(lambda: self.woken or self.stop_event.is_set(), timeout=timeout)
+            self.woken = False
+
+    def listen(self):
+        conn = None
+        while not self.stop_event.is_set():
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                    conn.cursor().execute(f'LISTEN {TASKS_CHANNEL}')
+                    self.wake()
+
+                if select.select([conn], [], [], 1.0)[0]:
+                    conn.poll()
+                    if conn.notifies:
+                        self.metrics.incr('wakeups', len(conn.notifies))
+                        conn.notifies.clear()
+                        self.wake()
+            except Exception as e:
+                self.log(f"ошибка LISTEN: {str(e)[:200]}")
+                if conn is not None and not conn.closed:
+                    conn.close()
+                self.stop_event.wait(self.poll_interval)
+
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGUSR1, self.request_dump)
+
+        self.log(f"старт, движок: {self.engine}, задач в работе: до {self.concurrency}")
+        self.claimer = threading.Thread(target=self.loop, name='registration-worker-claim', daemon=True)
+        writer = threading.Thread(target=self.drain, name='registration-worker-results', daemon=True)
+        self.claimer.start()
+        writer.start()
+        threading.Thread(target=self.listen, name='registration-worker-listen', daemon=True).start()
+
+        next_dump = time.time() + self.metrics_interval
+        stopping = False
+        while self.claimer.is_alive() or writer.is_alive():
+            self.claimer.join(timeout=0.5)
+            writer.join(timeout=0.5)
+            if self.stop_event.is_set() and not stopping:
+                stopping = True
+                self.log("получен сигнал остановки, завершаю текущие задачи")
+                with self.wakeup:
+                    self.wakeup.notify_all()
+            if self.dump_requested.is_set() or time.time() >= next_dump:
+                self.dump_requested.clear()
+                self.dump_metrics()
+                next_dump = time.time() + self.metrics_interval
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.dump_metrics()
+        self.log("остановлен")
+
+    def loop(self):
+        conn = None
+        while not self.stop_event.is_set():
+            if not self.slots.acquire(timeout=1):
+                continue
+            holding_slot = True
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                cur = conn.cursor()
+
+                settings = load_settings(cur)
+                task_row, rejected_by, retry_after = claim_task(conn, cur, settings, self.browser_key)
+                if not task_row:
+                    cur.close()
+                    self.slots.release()
+                    holding_slot = False
+                    self.metrics.incr('queued' if rejected_by else 'idle')
+                    self.wait_for_work(retry_after)
+                    continue
+
+                self.metrics.incr('claimed')
+                if self.stop_event.is_set():
+                    release_tasks(conn, cur, [task_row[0]])
+                    self.metrics.incr('released')
+                    cur.close()
+                    break
+
+                holding_slot = False
+                self.start_task(cur, task_row, settings)
+                cur.close()
+                conn.rollback()
+            except Exception as e:
+                self.log(f"ошибка цикла: {str(e)[:200]}")
+                if conn is not None and not conn.closed:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        conn.close()
+                self.stop_event.wait(self.poll_interval)
+            finally:
+                if holding_slot:
+                    self.slots.release()
+
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    def start_task(self, cur, task_row: tuple, settings: Dict[str, str]):
+        '''
+        Запускает задачу и сразу возвращается; слот освобождает drain после записи результата.
+        Контрольная точка читается в транзакции соединения захвата, которую loop сразу закрывает,
+        чтобы соединение не висело idle in transaction, пока все слоты заняты
+        '''
+        task_id, google_account_id, proxy_id, marktplaats_login, marktplaats_password, \
+        google_email, google_password, proxy_host, proxy_port, proxy_username, proxy_password = task_row[:11]
+
+        self.log(f"задача {task_id}: {google_email} через {proxy_host}:{proxy_port}")
+        self.metrics.task_started()
+        checkpoint: Dict[str, Any] = {}
+        task = (task_id, google_account_id, proxy_id, settings, checkpoint, time.time())
+        try:
+            checkpoint.update(load_checkpoint(cur, google_account_id, proxy_id))
+            if checkpoint:
+                self.metrics.incr('checkpoints_restored')
+            future = submit_registration(
+                self.executor,
+                google_email, google_password,
+                proxy_host, proxy_port, proxy_username, proxy_password,
+                marktplaats_login, marktplaats_password,
+                settings, checkpoint
+            )
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda done: self.finished.put((task, done)))
+
+    def drain(self):
+        conn = None
+        while not (self.stop_event.is_set() and not self.claimer.is_alive()
+                   and self.metrics.snapshot()['in_flight'] == 0):
+            try:
+                task, future = self.finished.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                self.finish_task(conn, task, future)
+            except Exception as e:
+                self.log(f"ошибка записи результата задачи {task[0]}: {str(e)[:200]}")
+                if conn is not None and not conn.closed:
+                    conn.close()
+            finally:
+                self.metrics.task_finished(time.time() - task[5])
+                self.slots.release()
+
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    def finish_task(self, conn, task: tuple, future: Future):
+        task_id, google_account_id, proxy_id, settings, checkpoint, _ = task
+        checkpoint_ttl = int(settings.get('checkpoint_ttl_minutes', '60'))
+        status = None
+        cur = conn.cursor()
+        try:
+            result = future.result()
+            save_checkpoint(cur, google_account_id, proxy_id, result, checkpoint, checkpoint_ttl)
+            status = save_task_result(conn, cur, task_id, result, settings)
+            self.metrics.incr('completed' if result['success'] else 'failed')
+        except Exception as e:
+            conn.rollback()
+            save_checkpoint(cur, google_account_id, proxy_id, {'success': False}, checkpoint, checkpoint_ttl)
+            status = save_task_exception(conn, cur, task_id, e, settings)
+            self.metrics.incr('errors')
+        finally:
+            cur.close()
+        if status == 'waiting':
+            self.metrics.incr('retried')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воркер регистрации Marktplaats')
+    parser.add_argument('--concurrency', type=int, default=os.environ.get('WORKER_CONCURRENCY'))
+    parser.add_argument('--poll-interval', type=float, default=30.0)
+    parser.add_argument('--metrics-interval', type=float, default=60.0)
+    parser.add_argument('--metrics-file', default=os.environ.get('WORKER_METRICS_FILE'))
+    args = parser.parse_args()
+
+    concurrency = args.concurrency
+    if concurrency is None and registration_engine() == 'playwright':
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        concurrency = load_settings(cur).get('browser_contexts_per_instance', '10')
+        cur.close()
+        conn.close()
+
+    RegistrationWorker(int(concurrency or 3), args.poll_interval, args.metrics_interval, args.metrics_file).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+-- Архив завершённых задач регистрации: горячая таблица хранит только актуальную очередь
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.registration_tasks_archive (
+    id INTEGER PRIMARY KEY,
+    google_account_id INTEGER,
+    proxy_id INTEGER,
+    marktplaats_login VARCHAR(255),
+    marktplaats_password VARCHAR(255),
+    status VARCHAR(50),
+    error_message TEXT,
+    attempts INTEGER DEFAULT 0,
+    created_at TIMESTAMP,
+    completed_at TIMESTAMP,
+    cookies_data TEXT,
+    logs TEXT,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индексы архива для проверки использованных аккаунтов/прокси и экспорта
+CREATE INDEX IF NOT EXISTS idx_archive_account_completed
+    ON t_p24911867_account_registration.registration_tasks_archive(google_account_id) WHERE status = 'completed';
+CREATE INDEX IF NOT EXISTS idx_archive_proxy_completed
+    ON t_p24911867_account_registration.registration_tasks_archive(proxy_id) WHERE status = 'completed';
+CREATE INDEX IF NOT EXISTS idx_archive_completed_at
+    ON t_p24911867_account_registration.registration_tasks_archive(completed_at) WHERE status = 'completed';
+
+-- Частичные индексы горячей таблицы под очередь и проверки NOT EXISTS
+CREATE INDEX IF NOT EXISTS idx_task_waiting
+    ON t_p24911867_account_registration.registration_tasks(created_at) WHERE status = 'waiting';
+CREATE INDEX IF NOT EXISTS idx_task_account_status
+    ON t_p24911867_account_registration.registration_tasks(google_account_id, status);
+CREATE INDEX IF NOT EXISTS idx_task_proxy_status
+    ON t_p24911867_account_registration.registration_tasks(proxy_id, status);
+CREATE INDEX IF NOT EXISTS idx_task_finished_at
+    ON t_p24911867_account_registration.registration_tasks((COALESCE(completed_at, created_at)))
+    WHERE status IN ('completed', 'failed');
+
+-- Настройки архивации
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('archive_retention_days', '7'),
+    ('archive_batch_size', '1000')
+ON CONFLICT (setting_key) DO NOTHING;
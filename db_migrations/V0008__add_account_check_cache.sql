@@ -0,0 +1,10 @@
+-- Время последней проверки Google аккаунта для кэширования результатов
+ALTER TABLE t_p24911867_account_registration.google_accounts 
+ADD COLUMN IF NOT EXISTS last_checked TIMESTAMP;
+
+-- Настройки массовой проверки аккаунтов
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('account_check_ttl_minutes', '60'),
+    ('account_check_workers', '10'),
+    ('account_check_timeout', '15')
+ON CONFLICT (setting_key) DO NOTHING;
@@ -0,0 +1,11 @@
+-- Cookies хранятся сжатыми (zlib) в BYTEA; старые значения переносятся как есть и читаются как обычный JSON
+ALTER TABLE t_p24911867_account_registration.registration_tasks 
+ALTER COLUMN cookies_data TYPE BYTEA USING convert_to(cookies_data, 'UTF8');
+ALTER TABLE t_p24911867_account_registration.registration_tasks_archive 
+ALTER COLUMN cookies_data TYPE BYTEA USING convert_to(cookies_data, 'UTF8');
+
+-- Данные уже сжаты, повторное сжатие TOAST только тратит CPU
+ALTER TABLE t_p24911867_account_registration.registration_tasks 
+ALTER COLUMN cookies_data SET STORAGE EXTERNAL;
+ALTER TABLE t_p24911867_account_registration.registration_tasks_archive 
+ALTER COLUMN cookies_data SET STORAGE EXTERNAL;
@@ -0,0 +1,34 @@
+-- Время захвата задачи браузерной сессией (для лимитов и времени ожидания в очереди)
+ALTER TABLE t_p24911867_account_registration.registration_tasks 
+ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+ALTER TABLE t_p24911867_account_registration.registration_tasks_archive 
+ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_task_processing
+    ON t_p24911867_account_registration.registration_tasks(started_at) WHERE status = 'processing';
+
+-- Token bucket по прокси и подсетям
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.scheduler_buckets (
+    bucket_key VARCHAR(255) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+-- Счётчики планировщика: допуски, отказы, время ожидания в очереди
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.scheduler_metrics (
+    metric_key VARCHAR(100) PRIMARY KEY,
+    metric_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Лимиты планировщика
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('max_browser_sessions', '5'),
+    ('session_lease_seconds', '600'),
+    ('proxy_max_sessions', '1'),
+    ('subnet_max_sessions', '2'),
+    ('proxy_bucket_capacity', '2'),
+    ('proxy_refill_per_minute', '1'),
+    ('subnet_bucket_capacity', '4'),
+    ('subnet_refill_per_minute', '2')
+ON CONFLICT (setting_key) DO NOTHING;
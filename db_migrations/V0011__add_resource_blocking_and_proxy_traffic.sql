@@ -0,0 +1,12 @@
+-- Статистика загрузки страниц через прокси
+ALTER TABLE t_p24911867_account_registration.proxies 
+ADD COLUMN IF NOT EXISTS pages_loaded BIGINT DEFAULT 0,
+ADD COLUMN IF NOT EXISTS transfer_bytes BIGINT DEFAULT 0,
+ADD COLUMN IF NOT EXISTS load_ms_total BIGINT DEFAULT 0;
+
+-- Политика блокировки ресурсов в браузере регистрации
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('block_resource_types', 'image,font,media'),
+    ('block_domains', 'doubleclick.net,google-analytics.com,googletagmanager.com,googlesyndication.com,googleadservices.com,facebook.net,hotjar.com,criteo.com,adnxs.com'),
+    ('page_load_strategy', 'eager')
+ON CONFLICT (setting_key) DO NOTHING;
@@ -0,0 +1,4 @@
+-- Сколько изолированных контекстов держать в одном браузере при REGISTRATION_ENGINE=playwright
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('browser_contexts_per_instance', '10')
+ON CONFLICT (setting_key) DO NOTHING;
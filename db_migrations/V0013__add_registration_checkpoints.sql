@@ -0,0 +1,17 @@
+-- Контрольные точки регистрации: сессия Google после успешного входа для повторных попыток
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.registration_checkpoints (
+    google_account_id INTEGER NOT NULL,
+    proxy_id INTEGER NOT NULL,
+    stage VARCHAR(50) NOT NULL,
+    cookies_data BYTEA,
+    expires_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (google_account_id, proxy_id)
+);
+
+ALTER TABLE t_p24911867_account_registration.registration_checkpoints 
+ALTER COLUMN cookies_data SET STORAGE EXTERNAL;
+
+INSERT INTO t_p24911867_account_registration.automation_settings (setting_key, setting_value) VALUES
+    ('checkpoint_ttl_minutes', '60')
+ON CONFLICT (setting_key) DO NOTHING;
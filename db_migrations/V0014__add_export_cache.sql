@@ -0,0 +1,11 @@
+-- Кэш отрендеренных экспортов: ключ формат+флаги, водяной знак MAX(completed_at) и количество завершённых задач
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.export_cache (
+    cache_key VARCHAR(100) PRIMARY KEY,
+    watermark_completed_at TIMESTAMP,
+    watermark_count INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_completed_at
+    ON t_p24911867_account_registration.registration_tasks(completed_at) WHERE status = 'completed';
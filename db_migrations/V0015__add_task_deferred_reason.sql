@@ -0,0 +1,3 @@
+-- Первая причина, по которой планировщик отложил задачу: отказы считаются по задачам, а не по попыткам захвата
+ALTER TABLE t_p24911867_account_registration.registration_tasks 
+ADD COLUMN IF NOT EXISTS deferred_by VARCHAR(20);
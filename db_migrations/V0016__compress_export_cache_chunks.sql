@@ -0,0 +1,18 @@
+-- Кэш экспорта хранится сжатыми (zlib) кусками: дозапись новых строк добавляет кусок,
+-- а не переписывает весь отрендеренный экспорт. Старый кэш просто пересобирается
+TRUNCATE t_p24911867_account_registration.export_cache;
+ALTER TABLE t_p24911867_account_registration.export_cache 
+DROP COLUMN IF EXISTS content;
+ALTER TABLE t_p24911867_account_registration.export_cache 
+ADD COLUMN IF NOT EXISTS chunk_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS t_p24911867_account_registration.export_cache_chunks (
+    cache_key VARCHAR(100) NOT NULL,
+    chunk_no INTEGER NOT NULL,
+    content BYTEA NOT NULL,
+    PRIMARY KEY (cache_key, chunk_no)
+);
+
+-- Данные уже сжаты, повторное сжатие TOAST только тратит CPU
+ALTER TABLE t_p24911867_account_registration.export_cache_chunks 
+ALTER COLUMN content SET STORAGE EXTERNAL;
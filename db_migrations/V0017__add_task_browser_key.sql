@@ -0,0 +1,4 @@
+-- Какой браузер обслуживает задачу: id воркера с общим playwright-движком (много контекстов в одном
+-- браузере) или NULL, если задача открывает собственный браузер (selenium, HTTP-вызов process)
+ALTER TABLE t_p24911867_account_registration.registration_tasks 
+ADD COLUMN IF NOT EXISTS browser_key VARCHAR(100);
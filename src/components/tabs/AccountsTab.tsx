@@ -105,6 +105,32 @@ export const AccountsTab = () => {
     }
   };
 
+  const testAllAccounts = async () => {
+    try {
+      const totals = { valid: 0, failed: 0, timedOut: 0, cached: 0 };
+      let afterId: number | null = null;
+      do {
+        const result = await api.accounts.testAll(false, afterId);
+        totals.valid += result.valid;
+        totals.failed += result.failed;
+        totals.timedOut += result.timedOut;
+        totals.cached += result.cached;
+        afterId = result.nextAfterId;
+        await loadAccounts();
+      } while (afterId !== null);
+      toast({
+        title: 'Проверка завершена',
+        description: `Работают: ${totals.valid}, ошибки: ${totals.failed}, таймаут: ${totals.timedOut}, из кэша: ${totals.cached}`,
+      });
+    } catch (error) {
+      toast({
+        title: 'Ошибка проверки',
+        description: 'Не удалось проверить аккаунты',
+        variant: 'destructive',
+      });
+    }
+  };
+
   return (
     <div className="space-y-6">
       <div>
@@ -136,7 +162,13 @@ export const AccountsTab = () => {
 
       <Card>
         <CardHeader>
-          <CardTitle>Список аккаунтов</CardTitle>
+          <div className="flex items-center justify-between">
+            <CardTitle>Список аккаунтов</CardTitle>
+            <Button variant="outline" onClick={testAllAccounts} disabled={accounts.length === 0}>
+              <Icon name="CheckCircle" size={16} className="mr-2" />
+              Проверить все
+            </Button>
+          </div>
         </CardHeader>
         <CardContent>
           {loading ? (
@@ -172,6 +172,7 @@ export const ProxyTab = () => {
                   <TableHead>Порт</TableHead>
                   <TableHead>Авторизация</TableHead>
                   <TableHead>Статус</TableHead>
+                  <TableHead>Трафик на страницу</TableHead>
                   <TableHead className="w-[150px]">Действия</TableHead>
                 </TableRow>
               </TableHeader>
@@ -202,6 +203,9 @@ export const ProxyTab = () => {
                         {proxy.status === 'failed' && 'Не работает'}
                       </Badge>
                     </TableCell>
+                    <TableCell className="text-muted-foreground">
+                      {proxy.pagesLoaded ? `${proxy.avgPageKb} KB · ${proxy.avgLoadMs} мс` : '—'}
+                    </TableCell>
                     <TableCell>
                       <div className="flex gap-2">
                         <Button
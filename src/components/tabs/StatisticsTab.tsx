@@ -1,17 +1,22 @@
 import { useState, useEffect } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
+import { Button } from '@/components/ui/button';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Alert, AlertDescription, AlertTitle } from '@/components/ui/alert';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
-import { api, RegistrationTask } from '@/lib/api';
+import { api, RegistrationTask, TaskSummary } from '@/lib/api';
 import { LineChart, Line, BarChart, Bar, PieChart, Pie, Cell, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 
 export const StatisticsTab = () => {
-  const [tasks, setTasks] = useState<RegistrationTask[]>([]);
+  const [summary, setSummary] = useState<TaskSummary | null>(null);
   const [loading, setLoading] = useState(false);
+  const [archiveTasks, setArchiveTasks] = useState<RegistrationTask[]>([]);
+  const [archivePage, setArchivePage] = useState(0);
+  const [archiveHasMore, setArchiveHasMore] = useState(false);
+  const [archiveLoading, setArchiveLoading] = useState(false);
   const { toast } = useToast();
 
   useEffect(() => {
@@ -23,8 +28,8 @@ export const StatisticsTab = () => {
   const loadTasks = async () => {
     setLoading(true);
     try {
-      const data = await api.registration.getTasks();
-      setTasks(data);
+      const data = await api.registration.getSummary();
+      setSummary(data);
     } catch (error) {
       toast({
         title: 'Ошибка загрузки',
@@ -36,11 +41,30 @@ export const StatisticsTab = () => {
     }
   };
 
-  const totalTasks = tasks.length;
-  const completedTasks = tasks.filter(t => t.status === 'completed').length;
-  const failedTasks = tasks.filter(t => t.status === 'failed').length;
-  const pendingTasks = tasks.filter(t => t.status === 'pending').length;
-  const processingTasks = tasks.filter(t => t.status === 'processing').length;
+  const loadArchive = async (page: number) => {
+    setArchiveLoading(true);
+    try {
+      const data = await api.registration.getArchive(page);
+      setArchiveTasks(data.tasks);
+      setArchivePage(data.page);
+      setArchiveHasMore(data.hasMore);
+    } catch (error) {
+      toast({
+        title: 'Ошибка загрузки',
+        description: 'Не удалось загрузить архив задач',
+        variant: 'destructive',
+      });
+    } finally {
+      setArchiveLoading(false);
+    }
+  };
+
+  const statusCounts = summary?.statusCounts || {};
+  const completedTasks = statusCounts.completed || 0;
+  const failedTasks = statusCounts.failed || 0;
+  const pendingTasks = statusCounts.waiting || 0;
+  const processingTasks = statusCounts.processing || 0;
+  const totalTasks = Object.values(statusCounts).reduce((sum, count) => sum + count, 0);
 
   const successRate = totalTasks > 0 ? Math.round((completedTasks / totalTasks) * 100) : 0;
   const failureRate = totalTasks > 0 ? Math.round((failedTasks / totalTasks) * 100) : 0;
@@ -52,43 +76,14 @@ export const StatisticsTab = () => {
     { name: 'Обработка', value: processingTasks, color: '#3b82f6' },
   ];
 
-  const timelineData = tasks
-    .filter(t => t.completedAt)
-    .reduce((acc, task) => {
-      const date = new Date(task.createdAt).toLocaleDateString();
-      const existing = acc.find(item => item.date === date);
-      if (existing) {
-        existing.count += 1;
-        if (task.status === 'completed') existing.success += 1;
-        if (task.status === 'failed') existing.failed += 1;
-      } else {
-        acc.push({
-          date,
-          count: 1,
-          success: task.status === 'completed' ? 1 : 0,
-          failed: task.status === 'failed' ? 1 : 0,
-        });
-      }
-      return acc;
-    }, [] as { date: string; count: number; success: number; failed: number }[]);
-
-  const errorTasks = tasks.filter(t => t.status === 'failed' && t.errorMessage);
-
-  const errorGroups = errorTasks.reduce((acc, task) => {
-    const error = task.errorMessage || 'Неизвестная ошибка';
-    if (!acc[error]) {
-      acc[error] = { count: 0, tasks: [] };
-    }
-    acc[error].count += 1;
-    acc[error].tasks.push(task);
-    return acc;
-  }, {} as Record<string, { count: number; tasks: RegistrationTask[] }>);
+  const timelineData = (summary?.timeline || []).map(item => ({
+    ...item,
+    date: new Date(item.date).toLocaleDateString(),
+  }));
 
-  const errorStats = Object.entries(errorGroups).map(([error, data]) => ({
-    error,
-    count: data.count,
-    tasks: data.tasks,
-  })).sort((a, b) => b.count - a.count);
+  const errorStats = summary?.errors || [];
+  const errorTasks = summary?.recentErrors || [];
+  const errorTotal = errorStats.reduce((sum, stat) => sum + stat.count, 0);
 
   return (
     <div className="space-y-6">
@@ -97,7 +92,7 @@ export const StatisticsTab = () => {
         <p className="text-muted-foreground">Аналитика процесса регистрации</p>
       </div>
 
-      {loading && tasks.length === 0 ? (
+      {loading && !summary ? (
         <div className="flex items-center justify-center h-96">
           <Icon name="Loader" size={48} className="animate-spin opacity-50" />
         </div>
@@ -144,7 +139,13 @@ export const StatisticsTab = () => {
             </Card>
           </div>
 
-          <Tabs defaultValue="charts" className="space-y-4">
+          <Tabs
+            defaultValue="charts"
+            className="space-y-4"
+            onValueChange={(value) => {
+              if (value === 'archive' && archiveTasks.length === 0) loadArchive(0);
+            }}
+          >
             <TabsList>
               <TabsTrigger value="charts">
                 <Icon name="BarChart3" size={16} className="mr-2" />
@@ -154,6 +155,10 @@ export const StatisticsTab = () => {
                 <Icon name="AlertTriangle" size={16} className="mr-2" />
                 Ошибки ({failedTasks})
               </TabsTrigger>
+              <TabsTrigger value="archive">
+                <Icon name="Archive" size={16} className="mr-2" />
+                Архив
+              </TabsTrigger>
             </TabsList>
 
             <TabsContent value="charts" className="space-y-4">
@@ -255,7 +260,7 @@ export const StatisticsTab = () => {
                                 <span className="font-medium">{stat.error}</span>
                               </div>
                               <p className="text-sm text-muted-foreground mt-1">
-                                Затронуто аккаунтов: {stat.tasks.map(t => t.email).filter(Boolean).join(', ').slice(0, 50)}...
+                                Затронуто аккаунтов: {stat.emails.join(', ').slice(0, 50)}...
                               </p>
                             </div>
                             <Badge variant="destructive" className="ml-4">
@@ -283,7 +288,7 @@ export const StatisticsTab = () => {
                           </TableRow>
                         </TableHeader>
                         <TableBody>
-                          {errorTasks.slice(0, 50).map((task) => (
+                          {errorTasks.map((task) => (
                             <TableRow key={task.id}>
                               <TableCell className="font-medium">{task.email || 'N/A'}</TableCell>
                               <TableCell className="text-muted-foreground">{task.proxy || 'N/A'}</TableCell>
@@ -300,9 +305,9 @@ export const StatisticsTab = () => {
                           ))}
                         </TableBody>
                       </Table>
-                      {errorTasks.length > 50 && (
+                      {errorTotal > errorTasks.length && (
                         <p className="text-center text-sm text-muted-foreground mt-4">
-                          Показано 50 из {errorTasks.length} ошибок
+                          Показано {errorTasks.length} из {errorTotal} ошибок
                         </p>
                       )}
                     </CardContent>
@@ -310,6 +315,70 @@ export const StatisticsTab = () => {
                 </>
               )}
             </TabsContent>
+
+            <TabsContent value="archive" className="space-y-4">
+              <Card>
+                <CardHeader>
+                  <CardTitle>Архив задач</CardTitle>
+                  <CardDescription>Завершённые и упавшие задачи, перенесённые из очереди</CardDescription>
+                </CardHeader>
+                <CardContent>
+                  {archiveLoading && archiveTasks.length === 0 ? (
+                    <div className="flex items-center justify-center h-32">
+                      <Icon name="Loader" size={32} className="animate-spin opacity-50" />
+                    </div>
+                  ) : archiveTasks.length === 0 ? (
+                    <p className="text-center text-sm text-muted-foreground">Архив пуст</p>
+                  ) : (
+                    <Table>
+                      <TableHeader>
+                        <TableRow>
+                          <TableHead>Email</TableHead>
+                          <TableHead>Прокси</TableHead>
+                          <TableHead>Статус</TableHead>
+                          <TableHead>Время</TableHead>
+                        </TableRow>
+                      </TableHeader>
+                      <TableBody>
+                        {archiveTasks.map((task) => (
+                          <TableRow key={task.id}>
+                            <TableCell className="font-medium">{task.email || 'N/A'}</TableCell>
+                            <TableCell className="text-muted-foreground">{task.proxy || 'N/A'}</TableCell>
+                            <TableCell>
+                              <Badge variant={task.status === 'completed' ? 'default' : 'destructive'}>
+                                {task.status === 'completed' ? 'Завершено' : 'Ошибка'}
+                              </Badge>
+                            </TableCell>
+                            <TableCell className="text-muted-foreground">
+                              {new Date(task.createdAt).toLocaleString()}
+                            </TableCell>
+                          </TableRow>
+                        ))}
+                      </TableBody>
+                    </Table>
+                  )}
+                  <div className="flex items-center justify-between mt-4">
+                    <Button
+                      variant="outline"
+                      size="sm"
+                      disabled={archivePage === 0 || archiveLoading}
+                      onClick={() => loadArchive(archivePage - 1)}
+                    >
+                      Назад
+                    </Button>
+                    <span className="text-sm text-muted-foreground">Страница {archivePage + 1}</span>
+                    <Button
+                      variant="outline"
+                      size="sm"
+                      disabled={!archiveHasMore || archiveLoading}
+                      onClick={() => loadArchive(archivePage + 1)}
+                    >
+                      Дальше
+                    </Button>
+                  </div>
+                </CardContent>
+              </Card>
+            </TabsContent>
           </Tabs>
         </>
       )}
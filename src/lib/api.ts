@@ -23,6 +23,9 @@ export interface Proxy {
   status: string;
   lastChecked?: string;
   createdAt: string;
+  pagesLoaded?: number;
+  avgPageKb?: number | null;
+  avgLoadMs?: number | null;
 }
 
 export interface RegistrationTask {
@@ -37,6 +40,13 @@ export interface RegistrationTask {
   logs?: string[];
 }
 
+export interface TaskSummary {
+  statusCounts: Record<string, number>;
+  timeline: { date: string; count: number; success: number; failed: number }[];
+  errors: { error: string; count: number; emails: string[] }[];
+  recentErrors: RegistrationTask[];
+}
+
 async function fetchWithErrorHandling(url: string, options?: RequestInit): Promise<Response> {
   const controller = new AbortController();
   const timeoutId = setTimeout(() => controller.abort(), 30000); // 30 секунд таймаут
@@ -90,6 +100,14 @@ export const api = {
       });
       return response.json();
     },
+    testAll: async (force = false, afterId: number | null = null): Promise<{ success: boolean; total: number; valid: number; failed: number; timedOut: number; cached: number; nextAfterId: number | null }> => {
+      const response = await fetchWithErrorHandling(API_URLS.accounts, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ all: true, force, afterId }),
+      });
+      return response.json();
+    },
     delete: async (id: number): Promise<void> => {
       await fetchWithErrorHandling(`${API_URLS.accounts}?id=${id}`, {
         method: 'DELETE',
@@ -128,6 +146,15 @@ export const api = {
       const data = await response.json();
       return data.tasks || [];
     },
+    getSummary: async (): Promise<TaskSummary> => {
+      const response = await fetchWithErrorHandling(`${API_URLS.registration}?view=summary`);
+      const data = await response.json();
+      return data.summary;
+    },
+    getArchive: async (page: number): Promise<{ tasks: RegistrationTask[]; page: number; hasMore: boolean }> => {
+      const response = await fetchWithErrorHandling(`${API_URLS.registration}?view=archive&page=${page}`);
+      return response.json();
+    },
     start: async (): Promise<{ success: boolean; tasksCreated: number }> => {
       const response = await fetchWithErrorHandling(API_URLS.registration, {
         method: 'POST',